@@ -52,6 +52,11 @@ def test_patient_manager():
         assert len(patients) >= 1, "Search failed"
         logger.info("✓ Search patients: OK")
         
+        # Test distinct departments
+        departments = pm.get_distinct_departments()
+        assert "Test Department" in departments, "Distinct departments failed"
+        logger.info("✓ Get distinct departments: OK")
+        
         # Test update
         test_patient.notes = "Updated notes"
         assert pm.update_patient(test_patient), "Update patient failed"
@@ -10,10 +10,12 @@ Chức năng:
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Callable
 from dataclasses import dataclass
 from datetime import datetime
+from types import SimpleNamespace
 
 import pydicom
 from pydicom.dataset import Dataset
@@ -21,11 +23,27 @@ from pydicom import dcmread, dcmwrite
 from pydicom.errors import InvalidDicomError
 import numpy as np
 
+try:
+    import dicomsdl
+    DICOMSDL_AVAILABLE = True
+except ImportError:
+    DICOMSDL_AVAILABLE = False
+
 from .patient_manager import PatientStudy
 
 # Cấu hình logging
 logger = logging.getLogger(__name__)
 
+# Số file giữa hai lần báo tiến độ khi đọc header
+PROGRESS_INTERVAL = 50
+
+# Các tag header cần cho import/organize khi đọc bằng dicomsdl
+HEADER_TAGS = (
+    'PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID',
+    'SeriesNumber', 'SeriesDescription', 'SeriesDate', 'SeriesTime', 'Modality',
+    'SliceThickness', 'PixelSpacing', 'ImageOrientationPatient', 'ImagePositionPatient'
+)
+
 @dataclass
 class DICOMSeries:
     """Thông tin DICOM series"""
@@ -90,53 +108,129 @@ class DICOMHandler:
     # RT DICOM specific modalities
     RT_MODALITIES = ['RTIMAGE', 'RTSTRUCT', 'RTPLAN', 'RTDOSE']
     
-    def __init__(self):
-        """Khởi tạo DICOMHandler"""
+    # Các tag bắt buộc khi validate
+    REQUIRED_FIELDS = ['PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID']
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Khởi tạo DICOMHandler
+        
+        Args:
+            max_workers: Số thread đọc header song song (mặc định 2 x số CPU)
+        """
+        self.max_workers = max_workers or (os.cpu_count() or 1) * 2
         logger.info("DICOMHandler được khởi tạo")
     
-    def is_dicom_file(self, file_path: str) -> bool:
+    def parse_one(self, file_path: str) -> Optional[Dataset]:
         """
-        Kiểm tra xem file có phải DICOM không
+        Đọc header của một file DICOM (không đọc pixel data)
+        
+        Dùng dicomsdl (parser C++) nếu được cài đặt, ngược lại dùng pydicom.
         
         Args:
             file_path: Đường dẫn file
             
         Returns:
-            bool: True nếu là DICOM file
+            Dataset (hoặc SimpleNamespace chứa HEADER_TAGS khi dùng dicomsdl)
+            hoặc None nếu không phải DICOM file
         """
+        if DICOMSDL_AVAILABLE:
+            return self._parse_header_dicomsdl(file_path)
+        
         try:
-            pydicom.dcmread(file_path, stop_before_pixels=True)
-            return True
+            return pydicom.dcmread(file_path, stop_before_pixels=True)
         except (InvalidDicomError, IsADirectoryError, PermissionError):
-            return False
+            return None
         except Exception as e:
             logger.warning(f"Không thể đọc file {file_path}: {e}")
-            return False
+            return None
     
-    def scan_directory(self, directory: str) -> List[str]:
+    def _parse_header_dicomsdl(self, file_path: str) -> Optional[SimpleNamespace]:
+        """Đọc HEADER_TAGS bằng dicomsdl, None nếu không phải DICOM file"""
+        try:
+            dset = dicomsdl.open(file_path)
+            # getValues trả về None cho tag không có trong file
+            values = dset.getValues(list(HEADER_TAGS))
+        except dicomsdl.DicomException as e:
+            logger.debug(f"Không thể đọc file {file_path}: {e}")
+            return None
+        
+        header = {tag: value for tag, value in zip(HEADER_TAGS, values) if value is not None}
+        if not header:
+            # dicomsdl mở được cả file không phải DICOM (dataset rỗng)
+            return None
+        
+        return SimpleNamespace(**header)
+    
+    def parse_files(self, file_paths: List[str],
+                    progress_callback: Optional[Callable[[int, int], None]] = None
+                    ) -> List[Tuple[str, Dataset]]:
         """
-        Quét thư mục tìm các DICOM files
+        Đọc header nhiều file song song bằng thread pool
+        
+        Việc đọc header chủ yếu là I/O nên chạy nhiều thread giúp chồng lấp
+        thời gian chờ đĩa giữa các file.
         
         Args:
-            directory: Đường dẫn thư mục
+            file_paths: Danh sách đường dẫn files
+            progress_callback: Hàm (số file đã đọc, tổng số file), được gọi
+                trên thread gọi hàm này
             
         Returns:
-            List[str]: Danh sách đường dẫn DICOM files
+            List[Tuple[str, Dataset]]: Các cặp (đường dẫn, header) của DICOM files,
+                giữ nguyên thứ tự đầu vào
         """
-        dicom_files = []
+        results = []
+        total = len(file_paths)
+        if total == 0:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            datasets = executor.map(self.parse_one, file_paths)
+            for done, (file_path, ds) in enumerate(zip(file_paths, datasets), 1):
+                if ds is not None:
+                    results.append((file_path, ds))
+                
+                if progress_callback and (done % PROGRESS_INTERVAL == 0 or done == total):
+                    progress_callback(done, total)
+        
+        return results
+    
+    def is_dicom_file(self, file_path: str) -> bool:
+        """
+        Kiểm tra xem file có phải DICOM không
+        
+        Args:
+            file_path: Đường dẫn file
+            
+        Returns:
+            bool: True nếu là DICOM file
+        """
+        return self.parse_one(file_path) is not None
+    
+    def _list_files(self, directory: str) -> List[str]:
+        """Liệt kê recursively tất cả files trong thư mục"""
         directory_path = Path(directory)
         
         if not directory_path.exists():
             logger.error(f"Thư mục không tồn tại: {directory}")
-            return dicom_files
+            return []
         
+        return [str(file_path) for file_path in directory_path.rglob('*') if file_path.is_file()]
+    
+    def scan_directory(self, directory: str) -> List[str]:
+        """
+        Quét thư mục tìm các DICOM files
+        
+        Args:
+            directory: Đường dẫn thư mục
+            
+        Returns:
+            List[str]: Danh sách đường dẫn DICOM files
+        """
         logger.info(f"Quét thư mục DICOM: {directory}")
         
-        # Quét recursively tất cả files
-        for file_path in directory_path.rglob('*'):
-            if file_path.is_file():
-                if self.is_dicom_file(str(file_path)):
-                    dicom_files.append(str(file_path))
+        dicom_files = [file_path for file_path, _ in self.parse_files(self._list_files(directory))]
         
         logger.info(f"Tìm được {len(dicom_files)} DICOM files")
         return dicom_files
@@ -220,14 +314,23 @@ class DICOMHandler:
         Returns:
             Dict[str, DICOMSeries]: Dictionary series_uid -> DICOMSeries
         """
-        series_dict = {}
-        
         logger.info(f"Tổ chức {len(dicom_files)} DICOM files theo series")
+        return self._organize_datasets(self.parse_files(dicom_files))
+    
+    def _organize_datasets(self, parsed_files: List[Tuple[str, Dataset]]) -> Dict[str, DICOMSeries]:
+        """
+        Tổ chức các header đã đọc theo series
+        
+        Args:
+            parsed_files: Các cặp (đường dẫn, header)
+            
+        Returns:
+            Dict[str, DICOMSeries]: Dictionary series_uid -> DICOMSeries
+        """
+        series_dict = {}
         
-        for file_path in dicom_files:
+        for file_path, ds in parsed_files:
             try:
-                ds = pydicom.dcmread(file_path, stop_before_pixels=True)
-                
                 series_uid = getattr(ds, 'SeriesInstanceUID', '')
                 if not series_uid:
                     logger.warning(f"File thiếu SeriesInstanceUID: {file_path}")
@@ -483,12 +586,7 @@ class DICOMHandler:
                 ds = pydicom.dcmread(file_path)
                 
                 # Basic validation checks
-                required_fields = ['PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'SOPInstanceUID']
-                missing_fields = []
-                
-                for field in required_fields:
-                    if not hasattr(ds, field) or not getattr(ds, field):
-                        missing_fields.append(field)
+                missing_fields = self._missing_required_fields(ds)
                 
                 if missing_fields:
                     error_msg = f"{file_path}: Missing required fields: {missing_fields}"
@@ -505,6 +603,11 @@ class DICOMHandler:
         logger.info(f"Validation complete: {len(result['valid'])} valid, {len(result['invalid'])} invalid")
         return result
     
+    def _missing_required_fields(self, ds: Dataset) -> List[str]:
+        """Trả về danh sách các tag bắt buộc bị thiếu trong dataset"""
+        return [field for field in self.REQUIRED_FIELDS
+                if not hasattr(ds, field) or not getattr(ds, field)]
+    
     def convert_to_patient_studies(self, series_dict: Dict[str, DICOMSeries]) -> List[PatientStudy]:
         """
         Convert DICOM series thành PatientStudy objects
@@ -564,13 +667,18 @@ class DICOMHandler:
         logger.info(f"Converted {len(patient_studies)} studies từ {len(series_dict)} series")
         return patient_studies
     
-    def import_dicom_directory(self, directory: str, patient_manager) -> bool:
+    def import_dicom_directory(self, directory: str, patient_manager,
+                               progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
         """
         Import toàn bộ DICOM directory vào patient database
         
+        Header của các file được đọc song song một lần duy nhất, sau đó dùng
+        lại cho validate và organize. Ghi database vẫn chạy tuần tự.
+        
         Args:
             directory: Đường dẫn thư mục DICOM
             patient_manager: PatientManager instance
+            progress_callback: Hàm (số file đã đọc, tổng số file)
             
         Returns:
             bool: True nếu thành công
@@ -578,21 +686,28 @@ class DICOMHandler:
         try:
             logger.info(f"Import DICOM directory: {directory}")
             
-            # Quét tìm DICOM files
-            dicom_files = self.scan_directory(directory)
-            if not dicom_files:
+            # Quét và đọc header DICOM files
+            parsed_files = self.parse_files(self._list_files(directory), progress_callback)
+            if not parsed_files:
                 logger.warning("Không tìm thấy DICOM files nào")
                 return False
             
-            # Validate files
-            validation = self.validate_dicom_integrity(dicom_files)
-            if validation['invalid']:
-                logger.warning(f"Có {len(validation['invalid'])} files không hợp lệ")
-                for error in validation['errors']:
-                    logger.warning(error)
+            # Validate headers
+            valid_files = []
+            invalid_count = 0
+            for file_path, ds in parsed_files:
+                missing_fields = self._missing_required_fields(ds)
+                if missing_fields:
+                    invalid_count += 1
+                    logger.warning(f"{file_path}: Missing required fields: {missing_fields}")
+                else:
+                    valid_files.append((file_path, ds))
+            
+            if invalid_count:
+                logger.warning(f"Có {invalid_count} files không hợp lệ")
             
             # Organize by series
-            series_dict = self.organize_by_series(validation['valid'])
+            series_dict = self._organize_datasets(valid_files)
             if not series_dict:
                 logger.error("Không thể organize DICOM series")
                 return False
@@ -607,54 +722,56 @@ class DICOMHandler:
             
             # Import từng patient
             success_count = 0
-            for patient_id, patient_series in patients_dict.items():
-                try:
-                    # Lấy metadata từ series đầu tiên
-                    first_file = patient_series[0].file_paths[0]
-                    metadata = self.read_dicom_metadata(first_file)
-                    
-                    if not metadata:
-                        logger.error(f"Không thể đọc metadata cho patient {patient_id}")
+            # Listener của patient_manager chỉ nhận một thông báo sau khi import xong
+            with patient_manager.batch_changes():
+                for patient_id, patient_series in patients_dict.items():
+                    try:
+                        # Lấy metadata từ series đầu tiên
+                        first_file = patient_series[0].file_paths[0]
+                        metadata = self.read_dicom_metadata(first_file)
+                        
+                        if not metadata:
+                            logger.error(f"Không thể đọc metadata cho patient {patient_id}")
+                            continue
+                        
+                        # Tạo hoặc cập nhật patient
+                        from .patient_manager import Patient, PatientStatus
+                        
+                        existing_patient = patient_manager.get_patient(patient_id)
+                        if existing_patient:
+                            patient = existing_patient
+                            logger.info(f"Cập nhật patient hiện có: {patient_id}")
+                        else:
+                            patient = Patient(
+                                patient_id=metadata.patient_id,
+                                patient_name=metadata.patient_name,
+                                birth_date=metadata.patient_birth_date,
+                                sex=metadata.patient_sex,
+                                created_date=datetime.now(),
+                                status=PatientStatus.ACTIVE
+                            )
+                            logger.info(f"Tạo patient mới: {patient_id}")
+                        
+                        # Convert series to studies
+                        series_dict_for_patient = {s.series_uid: s for s in patient_series}
+                        studies = self.convert_to_patient_studies(series_dict_for_patient)
+                        
+                        # Add studies to patient
+                        for study in studies:
+                            patient.add_study(study)
+                        
+                        # Save patient
+                        if existing_patient:
+                            patient_manager.update_patient(patient)
+                        else:
+                            patient_manager.create_patient(patient)
+                        
+                        success_count += 1
+                        logger.info(f"Đã import patient {patient_id} với {len(studies)} studies")
+                        
+                    except Exception as e:
+                        logger.error(f"Lỗi import patient {patient_id}: {e}")
                         continue
-                    
-                    # Tạo hoặc cập nhật patient
-                    from .patient_manager import Patient, PatientStatus
-                    
-                    existing_patient = patient_manager.get_patient(patient_id)
-                    if existing_patient:
-                        patient = existing_patient
-                        logger.info(f"Cập nhật patient hiện có: {patient_id}")
-                    else:
-                        patient = Patient(
-                            patient_id=metadata.patient_id,
-                            patient_name=metadata.patient_name,
-                            birth_date=metadata.patient_birth_date,
-                            sex=metadata.patient_sex,
-                            created_date=datetime.now(),
-                            status=PatientStatus.ACTIVE
-                        )
-                        logger.info(f"Tạo patient mới: {patient_id}")
-                    
-                    # Convert series to studies
-                    series_dict_for_patient = {s.series_uid: s for s in patient_series}
-                    studies = self.convert_to_patient_studies(series_dict_for_patient)
-                    
-                    # Add studies to patient
-                    for study in studies:
-                        patient.add_study(study)
-                    
-                    # Save patient
-                    if existing_patient:
-                        patient_manager.update_patient(patient)
-                    else:
-                        patient_manager.create_patient(patient)
-                    
-                    success_count += 1
-                    logger.info(f"Đã import patient {patient_id} với {len(studies)} studies")
-                    
-                except Exception as e:
-                    logger.error(f"Lỗi import patient {patient_id}: {e}")
-                    continue
             
             logger.info(f"Import hoàn tất: {success_count}/{len(patients_dict)} patients thành công")
             return success_count > 0
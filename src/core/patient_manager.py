@@ -9,19 +9,23 @@ Chức năng:
 """
 
 import os
+import csv
 import shutil
+import sqlite3
 import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 
-import pandas as pd
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, case
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, selectinload
+from sqlalchemy.pool import StaticPool
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -143,7 +147,7 @@ class PatientDB(Base):
     sex = Column(String(10), nullable=True)
     diagnosis = Column(Text, nullable=True)
     physician = Column(String(256), nullable=True)
-    department = Column(String(256), nullable=True)
+    department = Column(String(256), nullable=True, index=True)
     created_date = Column(DateTime, nullable=False)
     modified_date = Column(DateTime, nullable=False)
     status = Column(String(20), nullable=False)
@@ -182,6 +186,11 @@ class PatientManager:
         self.db_path = db_path or "data/patient_database/patients.db"
         self.data_root = Path(data_root or "data/patient_database")
         
+        # Callbacks được gọi sau mỗi thay đổi dữ liệu bệnh nhân
+        self._change_listeners: List[Callable[[], None]] = []
+        # Trạng thái batch_changes theo từng thread (depth, có thay đổi hay không)
+        self._batch_state = threading.local()
+        
         # Tạo thư mục nếu chưa tồn tại
         self.data_root.mkdir(parents=True, exist_ok=True)
         
@@ -195,12 +204,76 @@ class PatientManager:
         db_dir = Path(self.db_path).parent
         db_dir.mkdir(parents=True, exist_ok=True)
         
-        self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
+        if self.db_path == ":memory:":
+            # Database trong RAM: mọi thread dùng chung một connection,
+            # nếu không mỗi connection sẽ là một database rỗng riêng
+            self.engine = create_engine(
+                'sqlite://', echo=False, poolclass=StaticPool,
+                connect_args={'check_same_thread': False}
+            )
+        else:
+            self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
         Base.metadata.create_all(self.engine)
+        
+        # create_all không thêm index mới vào bảng đã tồn tại
+        for index in PatientDB.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        
         self.SessionLocal = sessionmaker(bind=self.engine)
         
         logger.info("Database đã được khởi tạo thành công")
     
+    def add_change_listener(self, callback: Callable[[], None]):
+        """
+        Đăng ký callback được gọi sau khi dữ liệu bệnh nhân thay đổi
+        
+        Callback có thể được gọi từ worker thread (ví dụ khi import DICOM),
+        GUI nên chuyển tiếp qua một Qt signal.
+        
+        Args:
+            callback: Hàm không tham số
+        """
+        if callback not in self._change_listeners:
+            self._change_listeners.append(callback)
+    
+    def remove_change_listener(self, callback: Callable[[], None]):
+        """Hủy đăng ký callback thay đổi dữ liệu"""
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+    
+    @contextmanager
+    def batch_changes(self):
+        """
+        Gom thông báo thay đổi của các thao tác ghi trên thread hiện tại
+        
+        Listener chỉ được gọi một lần khi thoát khỏi batch ngoài cùng (nếu có
+        thay đổi), thay vì một lần cho mỗi bệnh nhân (ví dụ khi import DICOM).
+        """
+        state = self._batch_state
+        depth = getattr(state, 'depth', 0)
+        if depth == 0:
+            state.changed = False
+        state.depth = depth + 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0 and state.changed:
+                self._notify_changed()
+    
+    def _notify_changed(self):
+        """Thông báo cho các listener rằng dữ liệu bệnh nhân đã thay đổi"""
+        state = self._batch_state
+        if getattr(state, 'depth', 0):
+            state.changed = True
+            return
+        
+        for callback in list(self._change_listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Lỗi trong change listener: {e}")
+    
     def create_patient(self, patient: Patient) -> bool:
         """
         Tạo bệnh nhân mới với studies
@@ -264,6 +337,7 @@ class PatientManager:
                 patient_dir.mkdir(exist_ok=True)
                 
                 logger.info(f"Đã tạo bệnh nhân mới: {patient.patient_id} với {len(patient.studies)} studies")
+                self._notify_changed()
                 return True
                 
         except Exception as e:
@@ -289,43 +363,77 @@ class PatientManager:
                 if not db_patient:
                     return None
                 
-                # Convert từ DB model sang Patient object
-                patient = Patient(
-                    patient_id=db_patient.patient_id,
-                    patient_name=db_patient.patient_name,
-                    birth_date=db_patient.birth_date,
-                    sex=db_patient.sex,
-                    diagnosis=db_patient.diagnosis,
-                    physician=db_patient.physician,
-                    department=db_patient.department,
-                    created_date=db_patient.created_date,
-                    modified_date=db_patient.modified_date,
-                    status=PatientStatus(db_patient.status),
-                    notes=db_patient.notes or '',
-                    tags=db_patient.tags.split(',') if db_patient.tags else []
-                )
-                
-                # Load studies từ database
-                import json
-                for db_study in db_patient.studies:
-                    file_paths = json.loads(db_study.file_paths) if db_study.file_paths else []
-                    study = PatientStudy(
-                        study_uid=db_study.study_uid,
-                        study_date=db_study.study_date,
-                        study_description=db_study.study_description,
-                        modality=db_study.modality,
-                        series_count=db_study.series_count,
-                        images_count=db_study.images_count,
-                        file_paths=file_paths
-                    )
-                    patient.add_study(study)
-                
-                return patient
+                return self._to_patient(db_patient)
                 
         except Exception as e:
             logger.error(f"Lỗi khi lấy thông tin bệnh nhân {patient_id}: {e}")
             return None
     
+    def get_patients_by_ids(self, patient_ids: List[str],
+                            raise_errors: bool = False) -> List[Patient]:
+        """
+        Lấy nhiều bệnh nhân theo danh sách ID
+        
+        Args:
+            patient_ids: Danh sách ID bệnh nhân
+            raise_errors: Ném lại exception thay vì trả về [] khi lỗi database
+            
+        Returns:
+            List[Patient]: Bệnh nhân theo đúng thứ tự patient_ids (bỏ qua ID không tồn tại)
+        """
+        try:
+            with self.SessionLocal() as session:
+                found = {}
+                # Chia nhỏ mệnh đề IN để không vượt giới hạn biến của SQLite
+                for start in range(0, len(patient_ids), 500):
+                    chunk = patient_ids[start:start + 500]
+                    for db_patient in session.query(PatientDB).options(
+                        selectinload(PatientDB.studies)
+                    ).filter(PatientDB.patient_id.in_(chunk)):
+                        found[db_patient.patient_id] = self._to_patient(db_patient)
+                
+                return [found[pid] for pid in patient_ids if pid in found]
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy danh sách bệnh nhân theo ID: {e}")
+            if raise_errors:
+                raise
+            return []
+    
+    def _to_patient(self, db_patient: PatientDB) -> Patient:
+        """Convert từ DB model sang Patient object (kèm studies)"""
+        patient = Patient(
+            patient_id=db_patient.patient_id,
+            patient_name=db_patient.patient_name,
+            birth_date=db_patient.birth_date,
+            sex=db_patient.sex,
+            diagnosis=db_patient.diagnosis,
+            physician=db_patient.physician,
+            department=db_patient.department,
+            created_date=db_patient.created_date,
+            modified_date=db_patient.modified_date,
+            status=PatientStatus(db_patient.status),
+            notes=db_patient.notes or '',
+            tags=db_patient.tags.split(',') if db_patient.tags else []
+        )
+        
+        # Load studies từ database
+        import json
+        for db_study in db_patient.studies:
+            file_paths = json.loads(db_study.file_paths) if db_study.file_paths else []
+            study = PatientStudy(
+                study_uid=db_study.study_uid,
+                study_date=db_study.study_date,
+                study_description=db_study.study_description,
+                modality=db_study.modality,
+                series_count=db_study.series_count,
+                images_count=db_study.images_count,
+                file_paths=file_paths
+            )
+            patient.add_study(study)
+        
+        return patient
+    
     def update_patient(self, patient: Patient) -> bool:
         """
         Cập nhật thông tin bệnh nhân
@@ -382,6 +490,7 @@ class PatientManager:
                 session.commit()
                 
                 logger.info(f"Đã cập nhật bệnh nhân: {patient.patient_id}")
+                self._notify_changed()
                 return True
                 
         except Exception as e:
@@ -421,6 +530,7 @@ class PatientManager:
                 
                 session.commit()
                 logger.info(f"Đã cập nhật bệnh nhân: {patient.patient_id}")
+                self._notify_changed()
                 return True
                 
         except Exception as e:
@@ -463,6 +573,7 @@ class PatientManager:
                     logger.info(f"Đã đánh dấu xóa bệnh nhân: {patient_id}")
                 
                 session.commit()
+                self._notify_changed()
                 return True
                 
         except Exception as e:
@@ -475,7 +586,9 @@ class PatientManager:
                        department: Optional[str] = None,
                        physician: Optional[str] = None,
                        date_from: Optional[datetime] = None,
-                       date_to: Optional[datetime] = None) -> List[Patient]:
+                       date_to: Optional[datetime] = None,
+                       eager: bool = False,
+                       raise_errors: bool = False) -> List[Patient]:
         """
         Tìm kiếm bệnh nhân với các bộ lọc
         
@@ -486,6 +599,9 @@ class PatientManager:
             physician: Bác sĩ
             date_from: Từ ngày
             date_to: Đến ngày
+            eager: Load studies của mọi bệnh nhân trong một query thay vì từng bệnh nhân
+            raise_errors: Ném lại exception thay vì trả về [] khi lỗi database
+                (để nơi gọi phân biệt lỗi với "không có kết quả", ví dụ khi cache)
             
         Returns:
             List[Patient]: Danh sách bệnh nhân tìm được
@@ -494,6 +610,9 @@ class PatientManager:
             with self.SessionLocal() as session:
                 query_obj = session.query(PatientDB)
                 
+                if eager:
+                    query_obj = query_obj.options(selectinload(PatientDB.studies))
+                
                 # Áp dụng các filter
                 if query:
                     query_obj = query_obj.filter(
@@ -520,57 +639,50 @@ class PatientManager:
                 db_patients = query_obj.order_by(PatientDB.modified_date.desc()).all()
                 
                 # Convert sang Patient objects với studies
-                patients = []
-                for db_patient in db_patients:
-                    patient = Patient(
-                        patient_id=db_patient.patient_id,
-                        patient_name=db_patient.patient_name,
-                        birth_date=db_patient.birth_date,
-                        sex=db_patient.sex,
-                        diagnosis=db_patient.diagnosis,
-                        physician=db_patient.physician,
-                        department=db_patient.department,
-                        created_date=db_patient.created_date,
-                        modified_date=db_patient.modified_date,
-                        status=PatientStatus(db_patient.status),
-                        notes=db_patient.notes or '',
-                        tags=db_patient.tags.split(',') if db_patient.tags else []
-                    )
-                    
-                    # Load studies từ database
-                    import json
-                    for db_study in db_patient.studies:
-                        file_paths = json.loads(db_study.file_paths) if db_study.file_paths else []
-                        study = PatientStudy(
-                            study_uid=db_study.study_uid,
-                            study_date=db_study.study_date,
-                            study_description=db_study.study_description,
-                            modality=db_study.modality,
-                            series_count=db_study.series_count,
-                            images_count=db_study.images_count,
-                            file_paths=file_paths
-                        )
-                        patient.add_study(study)
-                    
-                    patients.append(patient)
+                patients = [self._to_patient(db_patient) for db_patient in db_patients]
                 
                 logger.info(f"Tìm được {len(patients)} bệnh nhân")
                 return patients
                 
         except Exception as e:
             logger.error(f"Lỗi khi tìm kiếm bệnh nhân: {e}")
+            if raise_errors:
+                raise
             return []
     
-    def get_all_patients(self) -> List[Patient]:
+    def get_distinct_departments(self) -> List[str]:
+        """
+        Lấy danh sách các khoa có trong database
+        
+        Returns:
+            List[str]: Tên khoa (không trùng lặp, đã sắp xếp)
+        """
+        try:
+            with self.SessionLocal() as session:
+                rows = session.query(PatientDB.department).filter(
+                    PatientDB.department.isnot(None),
+                    PatientDB.department != ''
+                ).distinct().order_by(PatientDB.department).all()
+                
+                return [row[0] for row in rows]
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy danh sách khoa: {e}")
+            return []
+    
+    def get_all_patients(self, eager: bool = False) -> List[Patient]:
         """
         Lấy danh sách tất cả bệnh nhân (trừ deleted)
         
+        Args:
+            eager: Load studies theo lô (xem search_patients)
+        
         Returns:
             List[Patient]: Danh sách bệnh nhân
         """
-        return self.search_patients(status=PatientStatus.ACTIVE) + \
-               self.search_patients(status=PatientStatus.INACTIVE) + \
-               self.search_patients(status=PatientStatus.ARCHIVED)
+        return self.search_patients(status=PatientStatus.ACTIVE, eager=eager) + \
+               self.search_patients(status=PatientStatus.INACTIVE, eager=eager) + \
+               self.search_patients(status=PatientStatus.ARCHIVED, eager=eager)
     
     def anonymize_patient(self, patient_id: str) -> Optional[Patient]:
         """
@@ -600,12 +712,20 @@ class PatientManager:
             logger.error(f"Lỗi khi ẩn danh hóa bệnh nhân {patient_id}: {e}")
             return None
     
-    def backup_database(self, backup_path: Optional[str] = None) -> bool:
+    def backup_database(self, backup_path: Optional[str] = None,
+                        progress_callback: Optional[Callable[[int, int], None]] = None,
+                        pages: int = 1000) -> bool:
         """
         Sao lưu database
         
+        Dùng SQLite Online Backup API: copy theo từng nhóm page và nhả lock
+        giữa các bước, nên database vẫn dùng được trong lúc backup và bản
+        sao luôn nhất quán (khác với copy file khi đang có ghi dở).
+        
         Args:
             backup_path: Đường dẫn file backup
+            progress_callback: Hàm (số page đã copy, tổng số page)
+            pages: Số page copy mỗi bước
             
         Returns:
             bool: True nếu thành công
@@ -615,7 +735,23 @@ class PatientManager:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 backup_path = f"backup_patients_{timestamp}.db"
             
-            shutil.copy2(self.db_path, backup_path)
+            def on_progress(status, remaining, total):
+                if progress_callback:
+                    progress_callback(total - remaining, total)
+            
+            if self.db_path == ":memory:":
+                # Database trong RAM chỉ tồn tại trên connection của engine,
+                # sqlite3.connect(":memory:") sẽ mở một database rỗng khác
+                source = self.engine.raw_connection()
+            else:
+                source = sqlite3.connect(self.db_path)
+            destination = sqlite3.connect(backup_path)
+            try:
+                source.backup(destination, pages=pages, progress=on_progress)
+            finally:
+                destination.close()
+                source.close()
+            
             logger.info(f"Đã sao lưu database vào: {backup_path}")
             return True
             
@@ -648,50 +784,81 @@ class PatientManager:
             self._init_database()
             
             logger.info(f"Đã khôi phục database từ: {backup_path}")
+            self._notify_changed()
             return True
             
         except Exception as e:
             logger.error(f"Lỗi khi khôi phục database: {e}")
             return False
     
-    def export_to_csv(self, file_path: str, include_deleted: bool = False) -> bool:
+    def export_to_csv(self, file_path: str, include_deleted: bool = False,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      batch_size: int = 1000) -> bool:
         """
         Xuất danh sách bệnh nhân ra file CSV
         
+        Các dòng được đọc từ database theo từng batch và ghi trực tiếp ra file,
+        không giữ toàn bộ danh sách trong bộ nhớ.
+        
         Args:
             file_path: Đường dẫn file CSV
             include_deleted: Có bao gồm bệnh nhân đã xóa
+            progress_callback: Hàm (số dòng đã ghi, tổng số dòng)
+            batch_size: Số dòng đọc mỗi lần từ database
             
         Returns:
             bool: True nếu thành công
         """
         try:
-            patients = self.get_all_patients()
-            if include_deleted:
-                patients.extend(self.search_patients(status=PatientStatus.DELETED))
-            
-            # Tạo DataFrame
-            data = []
-            for patient in patients:
-                data.append({
-                    'Patient ID': patient.patient_id,
-                    'Patient Name': patient.patient_name,
-                    'Birth Date': patient.birth_date.strftime('%Y-%m-%d') if patient.birth_date else '',
-                    'Sex': patient.sex or '',
-                    'Diagnosis': patient.diagnosis or '',
-                    'Physician': patient.physician or '',
-                    'Department': patient.department or '',
-                    'Created Date': patient.created_date.strftime('%Y-%m-%d %H:%M:%S'),
-                    'Modified Date': patient.modified_date.strftime('%Y-%m-%d %H:%M:%S'),
-                    'Status': patient.status.value,
-                    'Notes': patient.notes,
-                    'Tags': ','.join(patient.tags)
-                })
-            
-            df = pd.DataFrame(data)
-            df.to_csv(file_path, index=False, encoding='utf-8-sig')
+            with self.SessionLocal() as session:
+                query_obj = session.query(PatientDB)
+                if not include_deleted:
+                    query_obj = query_obj.filter(PatientDB.status != PatientStatus.DELETED.value)
+                
+                total = query_obj.count()
+                written = 0
+                
+                with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+                    writer = csv.writer(f)
+                    writer.writerow([
+                        'Patient ID', 'Patient Name', 'Birth Date', 'Sex', 'Diagnosis',
+                        'Physician', 'Department', 'Created Date', 'Modified Date',
+                        'Status', 'Notes', 'Tags'
+                    ])
+                    
+                    # Giữ thứ tự nhóm như get_all_patients: active, inactive, archived
+                    # (rồi deleted), trong mỗi nhóm modified_date giảm dần
+                    status_rank = case(
+                        {status.value: rank for rank, status in enumerate(PatientStatus)},
+                        value=PatientDB.status
+                    )
+                    rows = query_obj.order_by(
+                        status_rank, PatientDB.modified_date.desc()
+                    ).yield_per(batch_size)
+                    for db_patient in rows:
+                        writer.writerow([
+                            db_patient.patient_id,
+                            db_patient.patient_name,
+                            db_patient.birth_date.strftime('%Y-%m-%d') if db_patient.birth_date else '',
+                            db_patient.sex or '',
+                            db_patient.diagnosis or '',
+                            db_patient.physician or '',
+                            db_patient.department or '',
+                            db_patient.created_date.strftime('%Y-%m-%d %H:%M:%S'),
+                            db_patient.modified_date.strftime('%Y-%m-%d %H:%M:%S'),
+                            db_patient.status,
+                            db_patient.notes or '',
+                            db_patient.tags or ''
+                        ])
+                        written += 1
+                        
+                        if progress_callback and written % batch_size == 0:
+                            progress_callback(written, total)
+                
+                if progress_callback:
+                    progress_callback(written, total)
             
-            logger.info(f"Đã xuất {len(patients)} bệnh nhân ra file: {file_path}")
+            logger.info(f"Đã xuất {written} bệnh nhân ra file: {file_path}")
             return True
             
         except Exception as e:
@@ -0,0 +1,123 @@
+"""
+Module cache kết quả tìm kiếm bệnh nhân trên Redis
+
+Chức năng:
+- Lưu danh sách patient_id theo bộ lọc tìm kiếm, dùng chung giữa các phiên/process
+- Hủy toàn bộ cache khi dữ liệu bệnh nhân thay đổi (qua tagged set)
+- Tự tắt khi không cấu hình TPS_REDIS_URL hoặc không có thư viện redis
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import List, Dict, Optional, Any
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Biến môi trường chứa URL Redis, để trống thì không dùng cache
+REDIS_URL_ENV = "TPS_REDIS_URL"
+
+# Thời gian sống mặc định của một kết quả tìm kiếm (giây)
+DEFAULT_TTL = 60
+
+# Timeout kết nối/đọc ghi Redis (giây), cache được tạo trên GUI thread
+# nên Redis không truy cập được phải thất bại nhanh thay vì treo giao diện
+SOCKET_TIMEOUT = 0.5
+
+
+class RedisSearchCache:
+    """
+    Cache bộ lọc -> danh sách patient_id trên Redis
+
+    Mỗi kết quả được lưu tại key sha1(bộ lọc), tên key được ghi vào một set
+    (tag) để hủy toàn bộ khi có thay đổi mà không cần SCAN theo pattern.
+    """
+
+    def __init__(self, url: str, namespace: str = "", ttl: int = DEFAULT_TTL):
+        """
+        Khởi tạo cache
+
+        Args:
+            url: URL Redis (vd: redis://localhost:6379/0)
+            namespace: Phân biệt các database bệnh nhân dùng chung một Redis
+            ttl: Thời gian sống của mỗi kết quả (giây)
+        """
+        self.client = redis.Redis.from_url(
+            url, socket_connect_timeout=SOCKET_TIMEOUT, socket_timeout=SOCKET_TIMEOUT
+        )
+        self.ttl = ttl
+
+        prefix = hashlib.sha1(namespace.encode()).hexdigest()[:12]
+        self.key_prefix = f"tps:search:{prefix}:"
+        self.tag_key = f"tps:search:{prefix}:keys"
+
+    @classmethod
+    def from_env(cls, namespace: str = "") -> Optional['RedisSearchCache']:
+        """
+        Tạo cache từ biến môi trường TPS_REDIS_URL
+
+        Returns:
+            RedisSearchCache hoặc None nếu không cấu hình/không kết nối được
+        """
+        url = os.environ.get(REDIS_URL_ENV)
+        if not url:
+            return None
+
+        if not REDIS_AVAILABLE:
+            logger.warning(f"{REDIS_URL_ENV} được cấu hình nhưng chưa cài thư viện redis")
+            return None
+
+        try:
+            cache = cls(url, namespace=namespace)
+            cache.client.ping()
+            logger.info(f"Dùng Redis cache cho kết quả tìm kiếm: {url}")
+            return cache
+        except Exception as e:
+            logger.warning(f"Không kết nối được Redis ({url}): {e}")
+            return None
+
+    def make_key(self, filters: Dict[str, Any]) -> str:
+        """Tạo key từ bộ lọc"""
+        filters_json = json.dumps(filters, sort_keys=True, default=str)
+        return self.key_prefix + hashlib.sha1(filters_json.encode()).hexdigest()
+
+    def get(self, filters: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        Lấy danh sách patient_id đã cache
+
+        Returns:
+            List[str] hoặc None nếu không có trong cache/lỗi Redis
+        """
+        try:
+            value = self.client.get(self.make_key(filters))
+            return json.loads(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"Lỗi đọc Redis cache: {e}")
+            return None
+
+    def set(self, filters: Dict[str, Any], patient_ids: List[str]):
+        """Lưu danh sách patient_id cho bộ lọc"""
+        key = self.make_key(filters)
+        try:
+            pipe = self.client.pipeline()
+            pipe.setex(key, self.ttl, json.dumps(patient_ids))
+            pipe.sadd(self.tag_key, key)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Lỗi ghi Redis cache: {e}")
+
+    def invalidate(self):
+        """Xóa toàn bộ kết quả đã cache của namespace này"""
+        try:
+            keys = self.client.smembers(self.tag_key)
+            self.client.delete(self.tag_key, *keys)
+        except Exception as e:
+            logger.warning(f"Lỗi xóa Redis cache: {e}")
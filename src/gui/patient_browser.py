@@ -10,29 +10,69 @@ Chức năng:
 """
 
 import os
+import bisect
 import logging
 from datetime import datetime, date
-from typing import List, Optional, Dict, Any
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QTableWidget, QTableWidgetItem, QPushButton, 
+    QTableView, QPushButton, 
     QLineEdit, QComboBox, QDateEdit, QLabel,
     QGroupBox, QSplitter, QTextEdit, QProgressBar,
     QFileDialog, QMessageBox, QDialog, QFormLayout,
     QDialogButtonBox, QHeaderView, QAbstractItemView,
     QMenu, QAction, QFrame
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
-from PyQt5.QtGui import QFont, QPixmap, QIcon
+from PyQt5.QtCore import (
+    Qt, QThread, pyqtSignal, QTimer, QAbstractTableModel, QModelIndex
+)
+from PyQt5.QtGui import QFont, QPixmap, QIcon, QBrush
 
 from ..core.patient_manager import PatientManager, Patient, PatientStatus
 from ..core.dicom_handler import DICOMHandler
+from ..core.search_cache import RedisSearchCache
 
 # Cấu hình logging
 logger = logging.getLogger(__name__)
 
+# Màu nền cột trạng thái, dùng chung cho mọi ô thay vì tạo brush mỗi lần vẽ
+_STATUS_BRUSH = {
+    PatientStatus.ACTIVE: QBrush(Qt.green),
+    PatientStatus.INACTIVE: QBrush(Qt.yellow),
+    PatientStatus.DELETED: QBrush(Qt.red),
+}
+
+# Tra cứu trạng thái theo chuỗi value (combo box, khóa cache tìm kiếm)
+_STATUS_BY_VALUE = {status.value: status for status in PatientStatus}
+
+# Mã trạng thái trong PatientTable.status và brush tương ứng theo mã
+_STATUS_CODE = {status: code for code, status in enumerate(PatientStatus)}
+_STATUS_BRUSH_BY_CODE = [_STATUS_BRUSH.get(status) for status in PatientStatus]
+
+# Thứ tự nhóm trạng thái trong danh sách đầy đủ (theo get_all_patients)
+_STATUS_RANK = {
+    PatientStatus.ACTIVE: 0,
+    PatientStatus.INACTIVE: 1,
+    PatientStatus.ARCHIVED: 2,
+}
+
+# Icon đã nạp theo tên file, mỗi file chỉ kiểm tra tồn tại một lần mỗi process
+_ICON_CACHE: Dict[str, QIcon] = {}
+
+
+def icon(name: str) -> QIcon:
+    """Lấy icon trong resources/icons (QIcon rỗng nếu không có file)"""
+    cached = _ICON_CACHE.get(name)
+    if cached is None:
+        path = Path(f"resources/icons/{name}")
+        cached = QIcon(str(path)) if path.exists() else QIcon()
+        _ICON_CACHE[name] = cached
+    return cached
+
 
 class PatientEditDialog(QDialog):
     """Dialog chỉnh sửa thông tin bệnh nhân"""
@@ -135,9 +175,8 @@ class PatientEditDialog(QDialog):
         self.physician_edit.setText(self.patient.physician or "")
         self.department_edit.setText(self.patient.department or "")
         
-        index = self.status_combo.findText(self.patient.status.value)
-        if index >= 0:
-            self.status_combo.setCurrentIndex(index)
+        # Combo được thêm theo thứ tự PatientStatus nên mã trạng thái chính là index
+        self.status_combo.setCurrentIndex(_STATUS_CODE[self.patient.status])
         
         self.notes_edit.setPlainText(self.patient.notes)
     
@@ -153,11 +192,137 @@ class PatientEditDialog(QDialog):
             'diagnosis': self.diagnosis_edit.toPlainText().strip() or None,
             'physician': self.physician_edit.text().strip() or None,
             'department': self.department_edit.text().strip() or None,
-            'status': PatientStatus(self.status_combo.currentText()),
+            'status': _STATUS_BY_VALUE[self.status_combo.currentText()],
             'notes': self.notes_edit.toPlainText().strip()
         }
 
 
+def format_patient_row(patient: Patient) -> Tuple[str, ...]:
+    """
+    Tạo các chuỗi hiển thị cho một dòng của bảng bệnh nhân
+    
+    Có thể gọi từ worker thread để strftime không chạy trên GUI thread.
+    Chẩn đoán giữ nguyên văn, view tự cắt bớt (ElideRight) khi vẽ.
+    """
+    return (
+        patient.patient_id,
+        patient.patient_name,
+        patient.birth_date.strftime("%d/%m/%Y") if patient.birth_date else "",
+        patient.sex or "",
+        patient.diagnosis or "",
+        patient.physician or "",
+        patient.department or "",
+        patient.created_date.strftime("%d/%m/%Y %H:%M"),
+        patient.status.value,
+    )
+
+
+@dataclass
+class PatientTable:
+    """
+    Dữ liệu hiển thị của bảng bệnh nhân theo cột
+    
+    Mỗi cột là một list chuỗi đã format, trạng thái lưu dạng mã (_STATUS_CODE)
+    để tô màu mà không cần truy cập object Patient khi vẽ. Dùng list thường
+    để chèn/xóa một dòng không phải copy lại toàn bộ cột.
+    """
+    columns: List[List[str]]
+    status: List[int]
+    
+    @classmethod
+    def from_patients(cls, patients: List[Patient]) -> 'PatientTable':
+        """Tạo bảng cột từ danh sách bệnh nhân"""
+        rows = [format_patient_row(patient) for patient in patients]
+        if rows:
+            columns = [list(column) for column in zip(*rows)]
+        else:
+            columns = [[] for _ in PatientTableModel.COLUMNS]
+        
+        status = [_STATUS_CODE[patient.status] for patient in patients]
+        return cls(columns=columns, status=status)
+    
+    def __len__(self) -> int:
+        return len(self.status)
+    
+    def insert(self, row: int, patient: Patient):
+        """Chèn dữ liệu hiển thị của một bệnh nhân vào dòng row"""
+        for column, value in zip(self.columns, format_patient_row(patient)):
+            column.insert(row, value)
+        self.status.insert(row, _STATUS_CODE[patient.status])
+    
+    def remove(self, row: int):
+        """Xóa dòng row"""
+        for column in self.columns:
+            del column[row]
+        del self.status[row]
+
+
+class PatientTableModel(QAbstractTableModel):
+    """Model dữ liệu cho bảng bệnh nhân"""
+    
+    COLUMNS = [
+        "Mã BN", "Tên bệnh nhân", "Ngày sinh", "Giới tính",
+        "Chẩn đoán", "Bác sĩ", "Khoa", "Ngày tạo", "Trạng thái"
+    ]
+    DIAGNOSIS_COLUMN = 4
+    STATUS_COLUMN = 8
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Model chỉ giữ chuỗi hiển thị đã format sẵn, object Patient nằm ở PatientBrowser
+        self._table = PatientTable.from_patients([])
+    
+    def set_table(self, table: PatientTable):
+        """Thay toàn bộ dữ liệu của model"""
+        self.beginResetModel()
+        self._table = table
+        self.endResetModel()
+    
+    def insert_patient(self, row: int, patient: Patient):
+        """Chèn một bệnh nhân vào dòng row"""
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._table.insert(row, patient)
+        self.endInsertRows()
+    
+    def remove_patient(self, row: int):
+        """Xóa bệnh nhân tại dòng row"""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._table.remove(row)
+        self.endRemoveRows()
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._table)
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        column = index.column()
+        
+        if role == Qt.DisplayRole:
+            return self._table.columns[column][index.row()]
+        
+        if role == Qt.ToolTipRole and column == self.DIAGNOSIS_COLUMN:
+            return self._table.columns[column][index.row()] or None
+        
+        if role == Qt.BackgroundRole and column == self.STATUS_COLUMN:
+            return _STATUS_BRUSH_BY_CODE[self._table.status[index.row()]]
+        
+        if role == Qt.UserRole:
+            # patient_id của dòng, dùng để tra PatientBrowser._patients_by_id
+            return self._table.columns[0][index.row()]
+        
+        return None
+
+
 class DICOMImportWorker(QThread):
     """Worker thread cho DICOM import"""
     
@@ -170,6 +335,10 @@ class DICOMImportWorker(QThread):
         self.patient_manager = patient_manager
         self.dicom_handler = DICOMHandler()
     
+    def _on_parse_progress(self, done: int, total: int):
+        """Báo tiến độ đọc DICOM headers (chiếm 90% tiến trình import)"""
+        self.progress.emit(int(done * 90 / total), f"Đang đọc DICOM files {done}/{total}...")
+    
     def run(self):
         """Chạy import process"""
         try:
@@ -177,7 +346,8 @@ class DICOMImportWorker(QThread):
             
             # Import DICOM directory
             success = self.dicom_handler.import_dicom_directory(
-                self.dicom_dir, self.patient_manager
+                self.dicom_dir, self.patient_manager,
+                progress_callback=self._on_parse_progress
             )
             
             if success:
@@ -190,6 +360,95 @@ class DICOMImportWorker(QThread):
             self.finished.emit(False, f"Lỗi import DICOM: {str(e)}")
 
 
+class PatientLoadWorker(QThread):
+    """Worker thread để load danh sách bệnh nhân từ database"""
+    
+    patients_ready = pyqtSignal(list, object)  # patients, PatientTable
+    error = pyqtSignal(str)
+    
+    def __init__(self, patient_manager: PatientManager):
+        super().__init__()
+        self.patient_manager = patient_manager
+    
+    def run(self):
+        """Chạy truy vấn database"""
+        try:
+            patients = self.patient_manager.get_all_patients(eager=True)
+            table = PatientTable.from_patients(patients)
+            self.patients_ready.emit(patients, table)
+            
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class CSVExportWorker(QThread):
+    """Worker thread cho export CSV"""
+    
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, file_path: str, patient_manager: PatientManager):
+        super().__init__()
+        self.file_path = file_path
+        self.patient_manager = patient_manager
+    
+    def _on_export_progress(self, written: int, total: int):
+        """Báo tiến độ ghi file"""
+        percent = int(written * 100 / total) if total else 100
+        self.progress.emit(percent, f"Đang export {written}/{total} bệnh nhân...")
+    
+    def run(self):
+        """Chạy export process"""
+        try:
+            self.progress.emit(0, "Đang export CSV...")
+            
+            success = self.patient_manager.export_to_csv(
+                self.file_path, progress_callback=self._on_export_progress
+            )
+            
+            if success:
+                self.finished.emit(True, f"Đã export ra file:\n{self.file_path}")
+            else:
+                self.finished.emit(False, "Không thể export file!")
+                
+        except Exception as e:
+            self.finished.emit(False, f"Lỗi export:\n{str(e)}")
+
+
+class BackupWorker(QThread):
+    """Worker thread cho backup database"""
+    
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(bool, str)
+    
+    def __init__(self, file_path: str, patient_manager: PatientManager):
+        super().__init__()
+        self.file_path = file_path
+        self.patient_manager = patient_manager
+    
+    def _on_backup_progress(self, copied: int, total: int):
+        """Báo tiến độ copy pages"""
+        percent = int(copied * 100 / total) if total else 100
+        self.progress.emit(percent, f"Đang backup database {percent}%...")
+    
+    def run(self):
+        """Chạy backup process"""
+        try:
+            self.progress.emit(0, "Đang backup database...")
+            
+            success = self.patient_manager.backup_database(
+                self.file_path, progress_callback=self._on_backup_progress
+            )
+            
+            if success:
+                self.finished.emit(True, f"Đã backup database:\n{self.file_path}")
+            else:
+                self.finished.emit(False, "Không thể backup database!")
+                
+        except Exception as e:
+            self.finished.emit(False, f"Lỗi backup:\n{str(e)}")
+
+
 class PatientBrowser(QWidget):
     """
     Widget duyệt và quản lý bệnh nhân
@@ -198,20 +457,51 @@ class PatientBrowser(QWidget):
     # Signals
     patient_selected = pyqtSignal(object)  # Patient object
     patient_double_clicked = pyqtSignal(object)
+    patients_changed = pyqtSignal()  # Dữ liệu bệnh nhân trong database thay đổi
     
     def __init__(self, patient_manager: PatientManager = None):
         super().__init__()
         self.patient_manager = patient_manager or PatientManager()
         self.current_patients: List[Patient] = []
         
+        # Tra cứu bệnh nhân đang hiển thị theo patient_id (UserRole của model)
+        self._patients_by_id: Dict[str, Patient] = {}
+        
+        # Cache kết quả tìm kiếm: bộ lọc -> tuple patient_id, hydrate từ _patient_cache
+        # (_patient_cache chỉ giữ bệnh nhân của kết quả đang hiển thị)
+        self._patient_cache: Dict[str, Patient] = {}
+        self._cached_search = lru_cache(maxsize=32)(self._search_patient_ids)
+        
+        # Cache dùng chung giữa các phiên qua Redis (None nếu không cấu hình TPS_REDIS_URL)
+        self._shared_cache = RedisSearchCache.from_env(namespace=os.path.abspath(self.patient_manager.db_path))
+        
+        self._refresh_pending = False
+        
+        # Bảng đang hiển thị kết quả tìm kiếm (không phải danh sách đầy đủ)
+        self._showing_search_results = False
+        # Đang ghi database từ chính browser, bảng được cập nhật tại chỗ
+        self._local_change = False
+        
+        # Worker threads
+        self.load_worker: Optional[PatientLoadWorker] = None
+        self.import_worker: Optional[DICOMImportWorker] = None
+        self.export_worker: Optional[CSVExportWorker] = None
+        self.backup_worker: Optional[BackupWorker] = None
+        self._reload_pending = False
+        # Có PatientLoadWorker chưa giao xong kết quả (kể cả khi thread đã dừng
+        # nhưng signal patients_ready còn trong hàng đợi)
+        self._loading = False
+        
         self.setup_ui()
         self.setup_connections()
         self.load_patients()
         
-        # Auto-refresh timer
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_patients)
-        self.refresh_timer.start(30000)  # Refresh every 30 seconds
+        # Refresh khi database thay đổi thay vì polling định kỳ.
+        # Listener có thể chạy trên worker thread nên đi qua signal (queued).
+        # Giữ đúng object callback để hủy đăng ký được (mỗi lần truy cập signal tạo bound object mới)
+        self._change_listener = self.patients_changed.emit
+        self.patient_manager.add_change_listener(self._change_listener)
+        self.destroyed.connect(partial(self.patient_manager.remove_change_listener, self._change_listener))
         
         logger.info("PatientBrowser được khởi tạo")
     
@@ -279,7 +569,7 @@ class PatientBrowser(QWidget):
         button_layout = QHBoxLayout()
         
         self.add_btn = QPushButton("Thêm bệnh nhân")
-        self.add_btn.setIcon(QIcon("resources/icons/add.png") if Path("resources/icons/add.png").exists() else QIcon())
+        self.add_btn.setIcon(icon("add.png"))
         button_layout.addWidget(self.add_btn)
         
         self.edit_btn = QPushButton("Sửa")
@@ -304,24 +594,20 @@ class PatientBrowser(QWidget):
         layout.addLayout(button_layout)
         
         # Patient table
-        self.patient_table = QTableWidget()
+        self.patient_model = PatientTableModel(self)
+        self.patient_table = QTableView()
+        self.patient_table.setModel(self.patient_model)
         self.patient_table.setAlternatingRowColors(True)
         self.patient_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.patient_table.setSelectionMode(QAbstractItemView.SingleSelection)
         
-        # Setup table columns
-        columns = [
-            "Mã BN", "Tên bệnh nhân", "Ngày sinh", "Giới tính",
-            "Chẩn đoán", "Bác sĩ", "Khoa", "Ngày tạo", "Trạng thái"
-        ]
-        self.patient_table.setColumnCount(len(columns))
-        self.patient_table.setHorizontalHeaderLabels(columns)
-        
         # Resize columns to content
         header = self.patient_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # Mã BN
         header.setSectionResizeMode(1, QHeaderView.Stretch)  # Tên BN
-        header.setSectionResizeMode(4, QHeaderView.Stretch)  # Chẩn đoán
+        header.setSectionResizeMode(4, QHeaderView.Fixed)  # Chẩn đoán
+        self.patient_table.setColumnWidth(4, 300)
+        self.patient_table.setTextElideMode(Qt.ElideRight)
         
         layout.addWidget(self.patient_table)
         
@@ -359,19 +645,39 @@ class PatientBrowser(QWidget):
         self.backup_btn.clicked.connect(self.backup_database)
         
         # Table selection
-        self.patient_table.itemSelectionChanged.connect(self.on_selection_changed)
-        self.patient_table.itemDoubleClicked.connect(self.on_item_double_clicked)
+        self.patient_table.selectionModel().selectionChanged.connect(self.on_selection_changed)
+        self.patient_table.doubleClicked.connect(self.on_item_double_clicked)
+        
+        # Database changes
+        self.patients_changed.connect(self.schedule_refresh)
     
     def load_patients(self):
-        """Load danh sách bệnh nhân"""
+        """Load danh sách bệnh nhân (truy vấn chạy trên worker thread)"""
+        if self.load_worker is not None and self.load_worker.isRunning():
+            # Load lại khi worker hiện tại xong để không bỏ sót thay đổi
+            self._reload_pending = True
+            return
+        
+        self._loading = True
+        self.status_label.setText("Đang tải bệnh nhân...")
+        if not self._progress_workers_running():
+            self.progress_bar.setRange(0, 0)  # Indeterminate
+            self.progress_bar.setVisible(True)
+        
+        self.load_worker = PatientLoadWorker(self.patient_manager)
+        self.load_worker.patients_ready.connect(self.on_patients_loaded)
+        self.load_worker.error.connect(self.on_patients_load_failed)
+        self.load_worker.finished.connect(self.on_load_worker_finished)
+        self.load_worker.start()
+    
+    def on_patients_loaded(self, patients: List[Patient], table: PatientTable):
+        """Nhận kết quả từ PatientLoadWorker"""
         try:
-            self.status_label.setText("Đang tải bệnh nhân...")
+            self.current_patients = patients
+            self._showing_search_results = False
             
-            # Get all patients
-            self.current_patients = self.patient_manager.get_all_patients()
-            
-            # Update table
-            self.update_patient_table()
+            # Update table (dùng chuỗi hiển thị đã format trên worker thread)
+            self.update_patient_table(table)
             
             # Update department filter
             self.update_department_filter()
@@ -379,67 +685,74 @@ class PatientBrowser(QWidget):
             self.status_label.setText(f"Đã tải {len(self.current_patients)} bệnh nhân")
             
         except Exception as e:
-            logger.error(f"Lỗi load patients: {e}")
-            self.status_label.setText(f"Lỗi: {e}")
-            QMessageBox.critical(self, "Lỗi", f"Không thể tải danh sách bệnh nhân:\n{e}")
+            self.on_patients_load_failed(str(e))
     
-    def update_patient_table(self):
-        """Cập nhật bảng bệnh nhân"""
-        self.patient_table.setRowCount(len(self.current_patients))
+    def on_patients_load_failed(self, message: str):
+        """Xử lý lỗi khi load bệnh nhân"""
+        logger.error(f"Lỗi load patients: {message}")
+        self.status_label.setText(f"Lỗi: {message}")
+        QMessageBox.critical(self, "Lỗi", f"Không thể tải danh sách bệnh nhân:\n{message}")
+    
+    def on_load_worker_finished(self):
+        """Dọn dẹp sau khi PatientLoadWorker kết thúc"""
+        self._loading = False
+        self._release_progress_bar(self.load_worker)
         
-        for row, patient in enumerate(self.current_patients):
-            # Mã BN
-            self.patient_table.setItem(row, 0, QTableWidgetItem(patient.patient_id))
-            
-            # Tên BN
-            self.patient_table.setItem(row, 1, QTableWidgetItem(patient.patient_name))
-            
-            # Ngày sinh
-            birth_date = patient.birth_date.strftime("%d/%m/%Y") if patient.birth_date else ""
-            self.patient_table.setItem(row, 2, QTableWidgetItem(birth_date))
-            
-            # Giới tính
-            self.patient_table.setItem(row, 3, QTableWidgetItem(patient.sex or ""))
-            
-            # Chẩn đoán
-            diagnosis = (patient.diagnosis[:50] + "...") if patient.diagnosis and len(patient.diagnosis) > 50 else (patient.diagnosis or "")
-            self.patient_table.setItem(row, 4, QTableWidgetItem(diagnosis))
-            
-            # Bác sĩ
-            self.patient_table.setItem(row, 5, QTableWidgetItem(patient.physician or ""))
-            
-            # Khoa
-            self.patient_table.setItem(row, 6, QTableWidgetItem(patient.department or ""))
-            
-            # Ngày tạo
-            created_date = patient.created_date.strftime("%d/%m/%Y %H:%M")
-            self.patient_table.setItem(row, 7, QTableWidgetItem(created_date))
-            
-            # Trạng thái
-            status_item = QTableWidgetItem(patient.status.value)
-            if patient.status == PatientStatus.ACTIVE:
-                status_item.setBackground(Qt.green)
-            elif patient.status == PatientStatus.INACTIVE:
-                status_item.setBackground(Qt.yellow)
-            elif patient.status == PatientStatus.DELETED:
-                status_item.setBackground(Qt.red)
-            
-            self.patient_table.setItem(row, 8, status_item)
+        if self._reload_pending:
+            self._reload_pending = False
+            self.load_patients()
+    
+    def _progress_workers_running(self, exclude: Optional[QThread] = None) -> bool:
+        """Có worker import/export/backup (báo tiến độ theo %) đang chạy không"""
+        workers = (self.import_worker, self.export_worker, self.backup_worker)
+        return any(worker is not None and worker is not exclude and worker.isRunning()
+                   for worker in workers)
+    
+    def _release_progress_bar(self, worker: QThread):
+        """
+        Trả lại progress bar khi worker kết thúc
+        
+        Không đụng tới progress bar nếu worker khác vẫn đang báo tiến độ,
+        còn load đang chạy thì chuyển về dạng indeterminate.
+        """
+        if self._progress_workers_running(exclude=worker):
+            return
+        
+        load_worker = self.load_worker
+        if load_worker is not None and load_worker is not worker and load_worker.isRunning():
+            self.progress_bar.setRange(0, 0)
+            return
+        
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+    
+    def update_patient_table(self, table: Optional[PatientTable] = None):
+        """
+        Cập nhật bảng bệnh nhân
+        
+        Args:
+            table: Dữ liệu hiển thị đã format sẵn cho current_patients (tùy chọn)
+        """
+        # Một lần reset model thay vì tạo item cho từng ô
+        if table is None:
+            table = PatientTable.from_patients(self.current_patients)
+        self.patient_model.set_table(table)
+        self._patients_by_id = {patient.patient_id: patient for patient in self.current_patients}
+        
+        # Reset model xóa selection mà không phát signal, đồng bộ lại trạng thái nút
+        self.on_selection_changed()
     
     def update_department_filter(self):
         """Cập nhật combo box khoa"""
-        # Get unique departments
-        departments = set()
-        for patient in self.current_patients:
-            if patient.department:
-                departments.add(patient.department)
+        # Lấy danh sách khoa trực tiếp từ database (SELECT DISTINCT)
+        departments = self.patient_manager.get_distinct_departments()
         
         # Clear and repopulate
         current_dept = self.department_filter.currentData()
         self.department_filter.clear()
         self.department_filter.addItem("Tất cả", None)
         
-        for dept in sorted(departments):
+        for dept in departments:
             self.department_filter.addItem(dept, dept)
         
         # Restore selection
@@ -460,15 +773,26 @@ class PatientBrowser(QWidget):
             date_from = datetime.combine(self.date_from.date().toPyDate(), datetime.min.time())
             date_to = datetime.combine(self.date_to.date().toPyDate(), datetime.max.time())
             
-            # Search
-            self.current_patients = self.patient_manager.search_patients(
-                query=query,
-                status=status,
-                department=department,
-                date_from=date_from,
-                date_to=date_to
+            # Search (dùng cache nếu bộ lọc đã được tìm trước đó)
+            patient_ids = self._cached_search(
+                query,
+                status.value if status else None,
+                department,
+                date_from.isoformat(),
+                date_to.isoformat()
             )
             
+            # Bệnh nhân của kết quả cache cũ đã bị bỏ khỏi _patient_cache thì load lại theo ID
+            missing = [pid for pid in patient_ids if pid not in self._patient_cache]
+            if missing:
+                for patient in self.patient_manager.get_patients_by_ids(missing, raise_errors=True):
+                    self._patient_cache[patient.patient_id] = patient
+            
+            self.current_patients = [self._patient_cache[pid] for pid in patient_ids
+                                     if pid in self._patient_cache]
+            self._patient_cache = {patient.patient_id: patient for patient in self.current_patients}
+            self._showing_search_results = True
+            
             # Update table
             self.update_patient_table()
             
@@ -478,6 +802,45 @@ class PatientBrowser(QWidget):
             logger.error(f"Lỗi search patients: {e}")
             self.status_label.setText(f"Lỗi tìm kiếm: {e}")
     
+    def _search_patient_ids(self, query: str, status_value: Optional[str],
+                            department: Optional[str], date_from_iso: str,
+                            date_to_iso: str) -> Tuple[str, ...]:
+        """Truy vấn database và trả về tuple patient_id (được memoize qua _cached_search)"""
+        filters = {
+            'query': query,
+            'status': status_value,
+            'department': department,
+            'date_from': date_from_iso,
+            'date_to': date_to_iso
+        }
+        
+        patient_ids = self._shared_cache.get(filters) if self._shared_cache else None
+        if patient_ids is not None:
+            patients = self.patient_manager.get_patients_by_ids(patient_ids, raise_errors=True)
+        else:
+            patients = self.patient_manager.search_patients(
+                query=query,
+                status=_STATUS_BY_VALUE[status_value] if status_value else None,
+                department=department,
+                date_from=datetime.fromisoformat(date_from_iso),
+                date_to=datetime.fromisoformat(date_to_iso),
+                raise_errors=True  # Lỗi database không được cache như "không có kết quả"
+            )
+            if self._shared_cache:
+                self._shared_cache.set(filters, [patient.patient_id for patient in patients])
+        
+        for patient in patients:
+            self._patient_cache[patient.patient_id] = patient
+        
+        return tuple(patient.patient_id for patient in patients)
+    
+    def invalidate_search_cache(self):
+        """Xóa cache kết quả tìm kiếm sau khi dữ liệu bệnh nhân thay đổi"""
+        self._cached_search.cache_clear()
+        self._patient_cache.clear()
+        if self._shared_cache:
+            self._shared_cache.invalidate()
+    
     def clear_filters(self):
         """Xóa bộ lọc"""
         self.search_edit.clear()
@@ -491,25 +854,101 @@ class PatientBrowser(QWidget):
     
     def refresh_patients(self):
         """Refresh danh sách bệnh nhân"""
-        self.search_patients() if self.search_edit.text() or self.status_filter.currentIndex() > 0 else self.load_patients()
+        self.invalidate_search_cache()
+        
+        if self.search_edit.text() or self.status_filter.currentIndex() > 0:
+            self.update_department_filter()
+            self.search_patients()
+        else:
+            self.load_patients()
+    
+    def schedule_refresh(self):
+        """Gom nhiều thay đổi liên tiếp (ví dụ khi import) thành một lần refresh"""
+        if self._local_change:
+            # Bảng đã được cập nhật tại chỗ, chỉ cần bỏ cache tìm kiếm
+            self.invalidate_search_cache()
+            return
+        
+        if self._refresh_pending:
+            return
+        
+        self._refresh_pending = True
+        QTimer.singleShot(0, self._run_pending_refresh)
+    
+    def _run_pending_refresh(self):
+        """Thực hiện refresh đã được lên lịch"""
+        self._refresh_pending = False
+        self.refresh_patients()
+    
+    def _run_local_change(self, func, *args):
+        """
+        Gọi một thao tác ghi database của PatientManager
+        
+        Khi bảng được sửa tại chỗ (xem _can_patch_rows), bỏ qua lần refresh
+        toàn bộ do change listener kích hoạt.
+        """
+        self._local_change = self._can_patch_rows()
+        try:
+            return func(*args)
+        finally:
+            self._local_change = False
+    
+    def _can_patch_rows(self) -> bool:
+        """
+        Có thể áp dụng thay đổi trực tiếp lên bảng hay không
+        
+        Chỉ khi bảng đang hiển thị danh sách đầy đủ và không có load nào đang chạy:
+        kết quả của load đó có thể đã cũ và sẽ ghi đè phần sửa tại chỗ, khi đó để
+        change listener lên lịch load lại.
+        """
+        return not self._showing_search_results and not self._loading
+    
+    def _insert_patient_row(self, patient: Patient) -> int:
+        """
+        Chèn bệnh nhân vào đúng vị trí trong danh sách đầy đủ
+        
+        Danh sách được nhóm theo trạng thái rồi sắp xếp modified_date giảm dần,
+        bệnh nhân vừa ghi có modified_date mới nhất nên nằm đầu nhóm của nó.
+        
+        Returns:
+            int: Dòng đã chèn, -1 nếu trạng thái không hiển thị trong danh sách
+        """
+        rank = _STATUS_RANK.get(patient.status)
+        if rank is None:
+            return -1
+        
+        ranks = [_STATUS_RANK.get(p.status, len(_STATUS_RANK)) for p in self.current_patients]
+        row = bisect.bisect_left(ranks, rank)
+        self.current_patients.insert(row, patient)
+        self.patient_model.insert_patient(row, patient)
+        self._patients_by_id[patient.patient_id] = patient
+        return row
+    
+    def _remove_patient_row(self, row: int):
+        """Xóa dòng row khỏi danh sách đầy đủ và bảng"""
+        patient = self.current_patients.pop(row)
+        self.patient_model.remove_patient(row)
+        self._patients_by_id.pop(patient.patient_id, None)
+    
+    def _after_local_change(self):
+        """Cập nhật phần phụ thuộc sau khi bảng được sửa tại chỗ"""
+        self.update_department_filter()
+        self.on_selection_changed()
     
     def on_selection_changed(self):
         """Xử lý khi selection thay đổi"""
-        selected = len(self.patient_table.selectedItems()) > 0
+        patient = self.get_selected_patient()
+        selected = patient is not None
         self.edit_btn.setEnabled(selected)
         self.delete_btn.setEnabled(selected)
         
         if selected:
-            row = self.patient_table.currentRow()
-            if 0 <= row < len(self.current_patients):
-                patient = self.current_patients[row]
-                self.patient_selected.emit(patient)
+            self.patient_selected.emit(patient)
     
-    def on_item_double_clicked(self):
+    def on_item_double_clicked(self, index: QModelIndex):
         """Xử lý double click"""
-        row = self.patient_table.currentRow()
-        if 0 <= row < len(self.current_patients):
-            patient = self.current_patients[row]
+        patient = self._patients_by_id.get(index.data(Qt.UserRole))
+        if patient:
             self.patient_double_clicked.emit(patient)
     
     def add_patient(self):
@@ -542,9 +981,11 @@ class PatientBrowser(QWidget):
                 )
                 
                 # Save to database
-                if self.patient_manager.create_patient(patient):
+                if self._run_local_change(self.patient_manager.create_patient, patient):
+                    if self._can_patch_rows():
+                        self._insert_patient_row(patient)
+                        self._after_local_change()
                     QMessageBox.information(self, "Thành công", "Đã thêm bệnh nhân mới!")
-                    self.load_patients()
                 else:
                     QMessageBox.critical(self, "Lỗi", "Không thể thêm bệnh nhân!")
                 
@@ -554,11 +995,9 @@ class PatientBrowser(QWidget):
     
     def edit_patient(self):
         """Sửa thông tin bệnh nhân"""
-        row = self.patient_table.currentRow()
-        if row < 0 or row >= len(self.current_patients):
+        patient = self.get_selected_patient()
+        if patient is None:
             return
-        
-        patient = self.current_patients[row]
         dialog = PatientEditDialog(patient, parent=self)
         
         if dialog.exec_() == QDialog.Accepted:
@@ -577,9 +1016,17 @@ class PatientBrowser(QWidget):
                 patient.modified_date = datetime.now()
                 
                 # Save to database
-                if self.patient_manager.update_patient(patient):
+                if self._run_local_change(self.patient_manager.update_patient, patient):
+                    if self._can_patch_rows():
+                        # modified_date/trạng thái đổi nên dòng có thể đổi vị trí
+                        row = self._selected_row(patient.patient_id)
+                        if row >= 0:
+                            self._remove_patient_row(row)
+                        row = self._insert_patient_row(patient)
+                        if row >= 0:
+                            self.patient_table.selectRow(row)
+                        self._after_local_change()
                     QMessageBox.information(self, "Thành công", "Đã cập nhật thông tin bệnh nhân!")
-                    self.load_patients()
                 else:
                     QMessageBox.critical(self, "Lỗi", "Không thể cập nhật bệnh nhân!")
                 
@@ -589,12 +1036,10 @@ class PatientBrowser(QWidget):
     
     def delete_patient(self):
         """Xóa bệnh nhân"""
-        row = self.patient_table.currentRow()
-        if row < 0 or row >= len(self.current_patients):
+        patient = self.get_selected_patient()
+        if patient is None:
             return
         
-        patient = self.current_patients[row]
-        
         reply = QMessageBox.question(
             self, 
             "Xác nhận xóa",
@@ -605,9 +1050,13 @@ class PatientBrowser(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                if self.patient_manager.delete_patient(patient.patient_id):
+                if self._run_local_change(self.patient_manager.delete_patient, patient.patient_id):
+                    if self._can_patch_rows():
+                        row = self._selected_row(patient.patient_id)
+                        if row >= 0:
+                            self._remove_patient_row(row)
+                        self._after_local_change()
                     QMessageBox.information(self, "Thành công", "Đã xóa bệnh nhân!")
-                    self.load_patients()
                 else:
                     QMessageBox.critical(self, "Lỗi", "Không thể xóa bệnh nhân!")
                     
@@ -629,29 +1078,29 @@ class PatientBrowser(QWidget):
         
         # Disable buttons
         self.import_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 100)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         
         # Start import worker
         self.import_worker = DICOMImportWorker(dicom_dir, self.patient_manager)
-        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.progress.connect(self.on_worker_progress)
         self.import_worker.finished.connect(self.on_import_finished)
         self.import_worker.start()
     
-    def on_import_progress(self, value: int, message: str):
-        """Cập nhật progress import"""
+    def on_worker_progress(self, value: int, message: str):
+        """Cập nhật progress của worker thread (import/export/backup)"""
         self.progress_bar.setValue(value)
         self.status_label.setText(message)
     
     def on_import_finished(self, success: bool, message: str):
         """Hoàn tất import"""
         self.import_btn.setEnabled(True)
-        self.progress_bar.setVisible(False)
+        self._release_progress_bar(self.import_worker)
         self.status_label.setText(message)
         
         if success:
             QMessageBox.information(self, "Thành công", "DICOM import hoàn tất!")
-            self.load_patients()
         else:
             QMessageBox.critical(self, "Lỗi", f"DICOM import thất bại:\n{message}")
     
@@ -664,16 +1113,32 @@ class PatientBrowser(QWidget):
             "CSV files (*.csv)"
         )
         
-        if file_path:
-            try:
-                if self.patient_manager.export_to_csv(file_path):
-                    QMessageBox.information(self, "Thành công", f"Đã export ra file:\n{file_path}")
-                else:
-                    QMessageBox.critical(self, "Lỗi", "Không thể export file!")
-                    
-            except Exception as e:
-                logger.error(f"Lỗi export CSV: {e}")
-                QMessageBox.critical(self, "Lỗi", f"Lỗi export:\n{e}")
+        if not file_path:
+            return
+        
+        self.export_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        
+        # Start export worker
+        self.export_worker = CSVExportWorker(file_path, self.patient_manager)
+        self.export_worker.progress.connect(self.on_worker_progress)
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.start()
+    
+    def on_export_finished(self, success: bool, message: str):
+        """Hoàn tất export CSV"""
+        self.export_btn.setEnabled(True)
+        self._release_progress_bar(self.export_worker)
+        
+        if success:
+            self.status_label.setText("Export CSV hoàn tất")
+            QMessageBox.information(self, "Thành công", message)
+        else:
+            logger.error(f"Lỗi export CSV: {message}")
+            self.status_label.setText("Export CSV thất bại")
+            QMessageBox.critical(self, "Lỗi", message)
     
     def backup_database(self):
         """Backup database"""
@@ -684,20 +1149,36 @@ class PatientBrowser(QWidget):
             "Database files (*.db)"
         )
         
-        if file_path:
-            try:
-                if self.patient_manager.backup_database(file_path):
-                    QMessageBox.information(self, "Thành công", f"Đã backup database:\n{file_path}")
-                else:
-                    QMessageBox.critical(self, "Lỗi", "Không thể backup database!")
-                    
-            except Exception as e:
-                logger.error(f"Lỗi backup database: {e}")
-                QMessageBox.critical(self, "Lỗi", f"Lỗi backup:\n{e}")
+        if not file_path:
+            return
+        
+        self.backup_btn.setEnabled(False)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        
+        # Start backup worker
+        self.backup_worker = BackupWorker(file_path, self.patient_manager)
+        self.backup_worker.progress.connect(self.on_worker_progress)
+        self.backup_worker.finished.connect(self.on_backup_finished)
+        self.backup_worker.start()
+    
+    def on_backup_finished(self, success: bool, message: str):
+        """Hoàn tất backup database"""
+        self.backup_btn.setEnabled(True)
+        self._release_progress_bar(self.backup_worker)
+        
+        if success:
+            self.status_label.setText("Backup database hoàn tất")
+            QMessageBox.information(self, "Thành công", message)
+        else:
+            logger.error(f"Lỗi backup database: {message}")
+            self.status_label.setText("Backup database thất bại")
+            QMessageBox.critical(self, "Lỗi", message)
     
     def show_context_menu(self, position):
         """Hiển thị context menu"""
-        if self.patient_table.itemAt(position) is None:
+        if not self.patient_table.indexAt(position).isValid():
             return
         
         menu = QMenu(self)
@@ -721,12 +1202,10 @@ class PatientBrowser(QWidget):
     
     def anonymize_patient(self):
         """Ẩn danh hóa bệnh nhân"""
-        row = self.patient_table.currentRow()
-        if row < 0 or row >= len(self.current_patients):
+        patient = self.get_selected_patient()
+        if patient is None:
             return
         
-        patient = self.current_patients[row]
-        
         reply = QMessageBox.question(
             self,
             "Xác nhận ẩn danh hóa",
@@ -737,14 +1216,18 @@ class PatientBrowser(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                anon_patient = self.patient_manager.anonymize_patient(patient.patient_id)
+                anon_patient = self._run_local_change(
+                    self.patient_manager.anonymize_patient, patient.patient_id
+                )
                 if anon_patient:
+                    if self._can_patch_rows():
+                        self._insert_patient_row(anon_patient)
+                        self._after_local_change()
                     QMessageBox.information(
                         self, 
                         "Thành công", 
                         f"Đã tạo bệnh nhân ẩn danh:\n{anon_patient.patient_name} ({anon_patient.patient_id})"
                     )
-                    self.load_patients()
                 else:
                     QMessageBox.critical(self, "Lỗi", "Không thể ẩn danh hóa bệnh nhân!")
                     
@@ -754,7 +1237,14 @@ class PatientBrowser(QWidget):
     
     def get_selected_patient(self) -> Optional[Patient]:
         """Lấy bệnh nhân đang được chọn"""
-        row = self.patient_table.currentRow()
-        if 0 <= row < len(self.current_patients):
-            return self.current_patients[row]
+        rows = self.patient_table.selectionModel().selectedRows()
+        if rows:
+            return self._patients_by_id.get(rows[0].data(Qt.UserRole))
         return None
+    
+    def _selected_row(self, patient_id: str) -> int:
+        """Dòng đang chọn nếu đúng là bệnh nhân patient_id, ngược lại -1"""
+        rows = self.patient_table.selectionModel().selectedRows()
+        if rows and rows[0].data(Qt.UserRole) == patient_id:
+            return rows[0].row()
+        return -1
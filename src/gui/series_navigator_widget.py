@@ -10,75 +10,383 @@ Chức năng:
 """
 
 import logging
-from typing import List, Dict, Optional, Any
+import stat
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Tuple
 from pathlib import Path
 import os
 
+import cv2
+import numpy as np
+import pydicom
+
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTreeWidget, 
-    QTreeWidgetItem, QLabel, QPushButton, QFrame,
-    QSplitter, QGroupBox, QGridLayout, QScrollArea,
+    QWidget, QVBoxLayout, QHBoxLayout, QTreeView,
+    QLabel, QPushButton, QFrame,
+    QSplitter, QGroupBox, QGridLayout,
     QProgressBar, QComboBox, QCheckBox, QLineEdit,
-    QTextEdit, QTabWidget, QListWidget, QListWidgetItem
+    QTextEdit, QTabWidget, QListWidget, QListWidgetItem, QListView
+)
+from PyQt5.QtCore import (
+    Qt, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer, QSize,
+    QAbstractItemModel, QAbstractListModel, QModelIndex
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QThread, QTimer, QSize
-from PyQt5.QtGui import QFont, QPixmap, QIcon
+from PyQt5.QtGui import QFont, QPixmap, QIcon, QImage, QPixmapCache
 
 from ..core.patient_manager import PatientManager, Patient, PatientStudy
 from ..core.dicom_handler import DICOMHandler, DICOMSeries, DICOMMetadata
-from ..core.image_processor import ImageProcessor
 
 # Cấu hình logging
 logger = logging.getLogger(__name__)
 
+# Kích thước thumbnail hiển thị (pixel)
+THUMBNAIL_SIZE = 128
+
+# Thư mục cache thumbnail PNG trên đĩa, dùng lại giữa các phiên
+THUMBNAIL_CACHE_DIR = Path.home() / ".tps" / "thumb_cache"
+
+
+def thumbnail_cache_path(series_uid: str) -> Path:
+    """Đường dẫn file PNG cache thumbnail của một series"""
+    return THUMBNAIL_CACHE_DIR / f"{series_uid}.png"
+
 
-class ThumbnailLoader(QThread):
-    """Worker thread để load thumbnails"""
+def _array_to_thumb_qimage(arr: np.ndarray,
+                           size: Tuple[int, int] = (THUMBNAIL_SIZE, THUMBNAIL_SIZE)) -> QImage:
+    """
+    Chuyển pixel array của một slice thành thumbnail QImage 8-bit
     
-    thumbnail_ready = pyqtSignal(str, object)  # series_uid, thumbnail_pixmap
-    progress_updated = pyqtSignal(int, str)  # percentage, status
+    Downsample bằng cv2.resize (INTER_AREA) trước, sau đó window theo
+    percentile 1-99 trên ảnh nhỏ, toàn bộ bằng phép toán vector của NumPy.
+    """
+    if arr.ndim == 3:
+        # Ảnh màu -> grayscale, multi-frame -> frame giữa
+        arr = arr.mean(axis=-1) if arr.shape[-1] in (3, 4) else arr[arr.shape[0] // 2]
+    
+    thumb = cv2.resize(arr.astype(np.float32), size, interpolation=cv2.INTER_AREA)
     
-    def __init__(self, series_list: List[DICOMSeries]):
+    lo, hi = np.percentile(thumb, [1, 99])
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    thumb = np.ascontiguousarray(((thumb - lo) * scale).clip(0, 255).astype(np.uint8))
+    
+    height, width = thumb.shape
+    return QImage(thumb.data, width, height, width, QImage.Format_Grayscale8).copy()
+
+
+class ThumbnailSignals(QObject):
+    """Signal holder cho ThumbnailTask (QRunnable không thể có signal)"""
+    
+    image_ready = pyqtSignal(int, str, object)  # generation, series_uid, QImage
+    task_done = pyqtSignal(int)  # generation
+
+
+class ThumbnailTask(QRunnable):
+    """Task đọc slice giữa của một series và tạo thumbnail trên thread pool"""
+    
+    def __init__(self, loader: 'ThumbnailLoader', series: DICOMSeries, generation: int):
         super().__init__()
-        self.series_list = series_list
-        self.image_processor = ImageProcessor()
-        self._stop_flag = False
+        self.loader = loader
+        self.series = series
+        self.generation = generation
     
     def run(self):
-        """Load thumbnails cho tất cả series"""
-        total = len(self.series_list)
-        
-        for i, series in enumerate(self.series_list):
-            if self._stop_flag:
-                break
+        """Decode DICOM và tạo QImage (QPixmap chỉ được tạo trên GUI thread)"""
+        signals = self.loader.signals
+        try:
+            # Bỏ qua task của lượt load đã bị hủy
+            if self.generation != self.loader.generation:
+                return
             
+            # Các element lớn (PixelData, overlay...) được defer, chỉ pixel data
+            # của slice giữa được đọc khi truy cập pixel_array
+            mid_index = len(self.series.file_paths) // 2
+            ds = pydicom.dcmread(self.series.file_paths[mid_index], defer_size="1 KB")
+            
+            image = _array_to_thumb_qimage(ds.pixel_array, self.loader.size)
+            
+            # Ghi cache PNG (QImage dùng được ngoài GUI thread)
             try:
-                self.progress_updated.emit(
-                    int((i / total) * 100), 
-                    f"Loading thumbnail {i+1}/{total}"
-                )
-                
-                # Load middle slice để làm thumbnail
-                if series.file_paths:
-                    mid_index = len(series.file_paths) // 2
-                    mid_file = series.file_paths[mid_index]
-                    
-                    # TODO: Load DICOM file và tạo thumbnail
-                    # Placeholder - tạo empty pixmap
-                    pixmap = QPixmap(128, 128)
-                    pixmap.fill(Qt.gray)
-                    
-                    self.thumbnail_ready.emit(series.series_uid, pixmap)
-                
+                THUMBNAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                image.save(str(thumbnail_cache_path(self.series.series_uid)), "PNG")
             except Exception as e:
-                logger.error(f"Error loading thumbnail for series {series.series_uid}: {e}")
-                continue
+                logger.warning(f"Cannot cache thumbnail for series {self.series.series_uid}: {e}")
+            
+            signals.image_ready.emit(self.generation, self.series.series_uid, image)
+            
+        except Exception as e:
+            logger.error(f"Error loading thumbnail for series {self.series.series_uid}: {e}")
         
-        self.progress_updated.emit(100, "Thumbnails loaded")
+        finally:
+            signals.task_done.emit(self.generation)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Điều phối load thumbnails song song trên QThreadPool
+    
+    Mỗi series là một ThumbnailTask, thumbnail được phát ra ngay khi
+    task tương ứng xong thay vì chờ cả danh sách.
+    """
+    
+    thumbnail_ready = pyqtSignal(str, object)  # series_uid, thumbnail_pixmap
+    progress_updated = pyqtSignal(int, str)  # percentage, status
+    
+    def __init__(self, size: tuple = (THUMBNAIL_SIZE, THUMBNAIL_SIZE), parent=None):
+        super().__init__(parent)
+        self.size = size
+        
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(os.cpu_count() or 1)
+        
+        # Signal từ các task được queue về thread của loader (GUI thread)
+        self.signals = ThumbnailSignals()
+        self.signals.image_ready.connect(self._on_image_ready)
+        self.signals.task_done.connect(self._on_task_done)
+        
+        self.generation = 0  # Tăng khi stop() để bỏ kết quả của lượt cũ
+        self._pending: set = set()
+        self._total = 0
+        self._done = 0
+    
+    def load(self, series_list: List[DICOMSeries]):
+        """Đưa các series vào hàng đợi load thumbnail"""
+        for series in series_list:
+            if not series.file_paths or series.series_uid in self._pending:
+                continue
+            
+            self._pending.add(series.series_uid)
+            self._total += 1
+            self.pool.start(ThumbnailTask(self, series, self.generation))
     
     def stop(self):
-        """Stop thumbnail loading"""
-        self._stop_flag = True
+        """Hủy các task chưa chạy và bỏ qua kết quả của task đang chạy"""
+        self.generation += 1
+        self.pool.clear()
+        self._pending.clear()
+        self._total = 0
+        self._done = 0
+    
+    def _on_image_ready(self, generation: int, series_uid: str, image: QImage):
+        if generation != self.generation:
+            return
+        self.thumbnail_ready.emit(series_uid, QPixmap.fromImage(image))
+    
+    def _on_task_done(self, generation: int):
+        if generation != self.generation:
+            return
+        
+        self._done += 1
+        self.progress_updated.emit(
+            int((self._done / self._total) * 100),
+            f"Loading thumbnail {self._done}/{self._total}"
+        )
+        
+        if self._done == self._total:
+            self._pending.clear()
+            self._total = 0
+            self._done = 0
+            self.progress_updated.emit(100, "Thumbnails loaded")
+
+
+class ScanSignals(QObject):
+    """Signal holder cho ScanStudyTask"""
+    
+    scan_finished = pyqtSignal(int, int, object)  # generation, study_row, List[DICOMSeries]
+
+
+class ScanStudyTask(QRunnable):
+    """Task scan thư mục DICOM của một study và tổ chức theo series trên thread pool"""
+    
+    def __init__(self, scan_func, study: PatientStudy, study_row: int,
+                 generation: int, signals: ScanSignals):
+        super().__init__()
+        self.scan_func = scan_func
+        self.study = study
+        self.study_row = study_row
+        self.generation = generation
+        self.signals = signals
+    
+    def run(self):
+        series_list = []
+        try:
+            series_list = self.scan_func(self.study)
+        finally:
+            # Luôn báo về để study không bị kẹt ở trạng thái đang load
+            self.signals.scan_finished.emit(self.generation, self.study_row, series_list)
+
+
+class StudySeriesModel(QAbstractItemModel):
+    """
+    Model cây studies -> series cho QTreeView
+    
+    internalId của index bằng 0 với dòng study, bằng (dòng study cha + 1)
+    với dòng series, nên parent() không cần tra cứu.
+    
+    Series của một study chỉ được load khi study được expand lần đầu
+    (fetchMore phát fetch_series, widget trả kết quả qua set_series).
+    """
+    
+    COLUMNS = ["Type", "Description", "Date", "Modality", "Series", "Images"]
+    
+    fetch_series = pyqtSignal(int)  # Dòng study cần load series
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._studies: List[PatientStudy] = []
+        # Series theo từng study, None nếu chưa load
+        self._series: List[Optional[List[DICOMSeries]]] = []
+    
+    def set_studies(self, studies: List[PatientStudy]):
+        """
+        Thay toàn bộ dữ liệu của model (series chưa được load)
+        
+        Args:
+            studies: Danh sách studies
+        """
+        self.beginResetModel()
+        self._studies = studies
+        self._series = [None] * len(studies)
+        self.endResetModel()
+    
+    def set_series(self, study_row: int, series: List[DICOMSeries]):
+        """Gắn các series đã load vào một study"""
+        if series:
+            self.beginInsertRows(self.index(study_row, 0), 0, len(series) - 1)
+            self._series[study_row] = series
+            self.endInsertRows()
+        else:
+            self._series[study_row] = []
+    
+    def clear(self):
+        """Xóa toàn bộ dữ liệu"""
+        self.set_studies([])
+    
+    def hasChildren(self, parent=QModelIndex()) -> bool:
+        if not parent.isValid():
+            return bool(self._studies)
+        if parent.internalId() == 0 and parent.column() == 0:
+            # Study chưa load vẫn hiện mũi tên expand
+            series = self._series[parent.row()]
+            return series is None or len(series) > 0
+        return False
+    
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return (parent.isValid() and parent.internalId() == 0
+                and self._series[parent.row()] is None)
+    
+    def fetchMore(self, parent: QModelIndex):
+        if not self.canFetchMore(parent):
+            return
+        self._series[parent.row()] = []  # Đánh dấu đang load
+        self.fetch_series.emit(parent.row())
+    
+    def index(self, row: int, column: int, parent=QModelIndex()) -> QModelIndex:
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, parent.row() + 1)
+    
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._studies)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self._series[parent.row()] or [])
+        return 0
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return len(self.COLUMNS)
+    
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def item_at(self, index: QModelIndex):
+        """Lấy PatientStudy hoặc DICOMSeries của một index"""
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            return self._studies[index.row()]
+        return self._series[index.internalId() - 1][index.row()]
+    
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        item = self.item_at(index)
+        
+        if role == Qt.UserRole:
+            return item
+        
+        if role != Qt.DisplayRole:
+            return None
+        
+        column = index.column()
+        if isinstance(item, PatientStudy):
+            if column == 0:
+                return "Study"
+            if column == 1:
+                return item.study_description
+            if column == 2:
+                return item.study_date.strftime('%Y-%m-%d')
+            if column == 3:
+                return item.modality
+            if column == 4:
+                return str(item.series_count)
+            return str(item.images_count)
+        
+        if column == 0:
+            return "Series"
+        if column == 1:
+            return item.series_description
+        if column == 2:
+            return item.series_date.strftime('%Y-%m-%d') if item.series_date else ""
+        if column == 3:
+            return item.modality
+        if column == 4:
+            return "1"
+        return str(item.slice_count)
+
+
+class ThumbnailListModel(QAbstractListModel):
+    """Model danh sách thumbnails cho QListView (IconMode)"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._series_uids: List[str] = []
+        self._icons: List[QIcon] = []
+    
+    def set_thumbnails(self, thumbnails: Dict[str, QPixmap]):
+        """Thay toàn bộ thumbnails (series_uid -> pixmap)"""
+        self.beginResetModel()
+        self._series_uids = list(thumbnails.keys())
+        self._icons = [QIcon(pixmap) for pixmap in thumbnails.values()]
+        self.endResetModel()
+    
+    def clear(self):
+        """Xóa toàn bộ thumbnails"""
+        self.set_thumbnails({})
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._icons)
+    
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        if role == Qt.DecorationRole:
+            return self._icons[index.row()]
+        
+        if role in (Qt.ToolTipRole, Qt.UserRole):
+            return self._series_uids[index.row()]
+        
+        return None
 
 
 class SeriesNavigatorWidget(QWidget):
@@ -87,6 +395,20 @@ class SeriesNavigatorWidget(QWidget):
     Tương đương với series navigator trong Eclipse TPS
     """
     
+    # Template thông tin series, điền bằng str.format_map
+    _SERIES_FMT = (
+        "Series Information:\n"
+        "- UID: {series_uid}\n"
+        "- Description: {series_description}\n"
+        "- Modality: {modality}\n"
+        "- Series Number: {series_number}\n"
+        "- Slice Count: {slice_count}\n"
+        "- Date: {date_str}\n"
+        "- Slice Thickness: {slice_thickness} mm\n"
+        "- Pixel Spacing: {pixel_spacing} mm\n"
+        "- Files: {file_count}"
+    )
+    
     # Signals
     series_selected = pyqtSignal(object)  # DICOMSeries object
     series_loaded = pyqtSignal(object, object, object)  # image_array, spacing, origin
@@ -97,16 +419,26 @@ class SeriesNavigatorWidget(QWidget):
         
         self.patient_manager = patient_manager or PatientManager()
         self.dicom_handler = DICOMHandler()
-        self.image_processor = ImageProcessor()
         
         # Current data
         self.current_patient: Optional[Patient] = None
         self.current_studies: List[PatientStudy] = []
         self.current_series: Dict[str, DICOMSeries] = {}
         self.series_thumbnails: Dict[str, QPixmap] = {}
+        self._last_selected_uid: Optional[str] = None  # UID series/study đang hiển thị chi tiết
+        
+        # Scan series của study trên thread pool, kết quả queue về GUI thread
+        self.scan_pool = QThreadPool(self)
+        self.scan_signals = ScanSignals()
+        self.scan_signals.scan_finished.connect(self.on_study_scanned)
+        self._scan_generation = 0  # Tăng khi đổi bệnh nhân để bỏ kết quả scan cũ
+        
+        # Cache kết quả scan thư mục theo (đường dẫn, mtime) cho các study dùng chung thư mục
+        self._cached_scan = lru_cache(maxsize=64)(self._scan_directory)
         
-        # Thumbnail loader
-        self.thumbnail_loader: Optional[ThumbnailLoader] = None
+        # Thumbnail loader (thread pool)
+        self.thumbnail_loader = ThumbnailLoader(parent=self)
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
         
         self.setup_ui()
         self.load_patients()
@@ -175,7 +507,7 @@ class SeriesNavigatorWidget(QWidget):
         
         # Patient combo box
         self.patient_combo = QComboBox()
-        self.patient_combo.currentTextChanged.connect(self.on_patient_changed)
+        self.patient_combo.currentIndexChanged.connect(lambda _=None: self.on_patient_changed())
         layout.addWidget(self.patient_combo)
         
         # Patient info
@@ -191,13 +523,14 @@ class SeriesNavigatorWidget(QWidget):
         widget = QGroupBox("Studies & Series")
         layout = QVBoxLayout()
         
-        # Tree widget
-        self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderLabels([
-            "Type", "Description", "Date", "Modality", "Series", "Images"
-        ])
-        self.tree_widget.itemSelectionChanged.connect(self.on_tree_selection_changed)
-        self.tree_widget.itemDoubleClicked.connect(self.on_tree_item_double_clicked)
+        # Tree view (model/view, dữ liệu nằm trong StudySeriesModel)
+        self.tree_model = StudySeriesModel(self)
+        self.tree_widget = QTreeView()
+        self.tree_widget.setUniformRowHeights(True)  # Mọi dòng cùng chiều cao, bỏ qua sizeHint từng dòng
+        self.tree_widget.setModel(self.tree_model)
+        self.tree_model.fetch_series.connect(self.on_fetch_series)
+        self.tree_widget.selectionModel().currentChanged.connect(self.on_tree_selection_changed)
+        self.tree_widget.doubleClicked.connect(self.on_tree_item_double_clicked)
         
         # Set column widths
         self.tree_widget.setColumnWidth(0, 80)
@@ -252,19 +585,18 @@ class SeriesNavigatorWidget(QWidget):
         thumbnail_tab = QWidget()
         thumbnail_layout = QVBoxLayout()
         
-        # Thumbnail scroll area
-        self.thumbnail_scroll = QScrollArea()
-        self.thumbnail_scroll.setWidgetResizable(True)
-        self.thumbnail_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.thumbnail_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        # Thumbnail view (chỉ vẽ các item đang hiển thị, không tạo widget cho từng ảnh)
+        self.thumbnail_model = ThumbnailListModel(self)
+        self.thumbnail_view = QListView()
+        self.thumbnail_view.setModel(self.thumbnail_model)
+        self.thumbnail_view.setViewMode(QListView.IconMode)
+        self.thumbnail_view.setFlow(QListView.LeftToRight)
+        self.thumbnail_view.setWrapping(False)
+        self.thumbnail_view.setUniformItemSizes(True)
+        self.thumbnail_view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.thumbnail_view.setMovement(QListView.Static)
         
-        # Thumbnail container
-        self.thumbnail_container = QWidget()
-        self.thumbnail_layout = QHBoxLayout()
-        self.thumbnail_container.setLayout(self.thumbnail_layout)
-        self.thumbnail_scroll.setWidget(self.thumbnail_container)
-        
-        thumbnail_layout.addWidget(self.thumbnail_scroll)
+        thumbnail_layout.addWidget(self.thumbnail_view)
         
         thumbnail_tab.setLayout(thumbnail_layout)
         tab_widget.addTab(thumbnail_tab, "Thumbnails")
@@ -278,7 +610,7 @@ class SeriesNavigatorWidget(QWidget):
         try:
             self.status_label.setText("Loading patients...")
             
-            patients = self.patient_manager.get_all_patients()
+            patients = self.patient_manager.get_all_patients(eager=True)
             
             # Clear và repopulate combo box
             self.patient_combo.clear()
@@ -302,20 +634,23 @@ class SeriesNavigatorWidget(QWidget):
         if patient_data is None:
             self.current_patient = None
             self.patient_info_label.setText("No patient selected")
-            self.tree_widget.clear()
+            self.tree_model.clear()
             return
         
         self.current_patient = patient_data
         
-        # Update patient info
-        info_text = f"""
+        # Update patient info (HTML được render một lần và lưu trên object Patient)
+        info_html = getattr(patient_data, '_info_html', None)
+        if info_html is None:
+            info_html = f"""
         <b>Name:</b> {patient_data.patient_name}<br>
         <b>ID:</b> {patient_data.patient_id}<br>
         <b>Birth Date:</b> {patient_data.birth_date.strftime('%Y-%m-%d') if patient_data.birth_date else 'Unknown'}<br>
         <b>Sex:</b> {patient_data.sex or 'Unknown'}<br>
         <b>Diagnosis:</b> {patient_data.diagnosis or 'Not specified'}
         """
-        self.patient_info_label.setText(info_text)
+            patient_data._info_html = info_html
+        self.patient_info_label.setText(info_html)
         
         # Load studies
         self.load_patient_studies()
@@ -330,94 +665,128 @@ class SeriesNavigatorWidget(QWidget):
         if not self.current_patient:
             return
         
+        # Ngắt slot selection trong lúc thay dữ liệu, đồng bộ lại một lần ở cuối
+        selection_model = self.tree_widget.selectionModel()
+        selection_model.currentChanged.disconnect(self.on_tree_selection_changed)
+        
         try:
             self.status_label.setText("Loading studies...")
             
-            # Clear tree
-            self.tree_widget.clear()
+            # Bỏ các scan/thumbnail đang chờ của bệnh nhân trước
+            self._scan_generation += 1
+            self.scan_pool.clear()
+            self.thumbnail_loader.stop()
+            
+            # Bỏ series/thumbnails của bệnh nhân trước (thumbnail vẫn còn trong QPixmapCache)
+            self.current_series.clear()
+            self.series_thumbnails.clear()
+            self.clear_thumbnails()
             
             # Get studies từ patient
             studies = self.current_patient.studies
             self.current_studies = studies
             
+            # Series được load khi expand từng study (xem on_fetch_series)
+            self.tree_model.set_studies(studies)
+            
             if not studies:
                 self.status_label.setText("No studies found for this patient")
                 return
             
-            # Add studies to tree
-            for study in studies:
-                study_item = QTreeWidgetItem([
-                    "Study",
-                    study.study_description,
-                    study.study_date.strftime('%Y-%m-%d'),
-                    study.modality,
-                    str(study.series_count),
-                    str(study.images_count)
-                ])
-                study_item.setData(0, Qt.UserRole, study)
-                self.tree_widget.addTopLevelItem(study_item)
-                
-                # Load series cho study này
-                self.load_study_series(study, study_item)
-            
-            # Expand first study
-            if self.tree_widget.topLevelItemCount() > 0:
-                self.tree_widget.expandItem(self.tree_widget.topLevelItem(0))
+            # Expand first study. Ngay sau reset model QTreeView chỉ ghi nhận
+            # trạng thái expand mà không gọi fetchMore, nên tự gọi để load series
+            first_study = self.tree_model.index(0, 0)
+            self.tree_widget.expand(first_study)
+            if self.tree_model.canFetchMore(first_study):
+                self.tree_model.fetchMore(first_study)
             
             self.status_label.setText(f"Loaded {len(studies)} studies")
             
         except Exception as e:
             logger.error(f"Error loading studies: {e}")
             self.status_label.setText(f"Error loading studies: {e}")
+        
+        finally:
+            selection_model.currentChanged.connect(self.on_tree_selection_changed)
+            
+            # Reset model xóa current index mà không phát currentChanged
+            self.on_tree_selection_changed()
+    
+    def on_fetch_series(self, study_row: int):
+        """Scan series ở background khi một study được expand lần đầu"""
+        self.status_label.setText("Scanning series...")
+        self.scan_pool.start(ScanStudyTask(
+            self.load_study_series, self.current_studies[study_row], study_row,
+            self._scan_generation, self.scan_signals
+        ))
+    
+    def on_study_scanned(self, generation: int, study_row: int, series_list: List[DICOMSeries]):
+        """Nhận kết quả scan của một study (GUI thread)"""
+        if generation != self._scan_generation:
+            return
+        
+        # Store series reference
+        self.current_series.update((series.series_uid, series) for series in series_list)
+        
+        self.tree_model.set_series(study_row, series_list)
+        self.status_label.setText(f"Loaded {len(series_list)} series")
+        
+        # Load thumbnails của các series song song ở background
+        self.load_thumbnails(series_list)
     
-    def load_study_series(self, study: PatientStudy, study_item: QTreeWidgetItem):
-        """Load series cho một study"""
+    def load_study_series(self, study: PatientStudy) -> List[DICOMSeries]:
+        """
+        Load series cho một study
+        
+        Chạy trên thread pool (ScanStudyTask), không truy cập widget.
+        
+        Returns:
+            List[DICOMSeries]: Các series của study
+        """
+        series_list = []
         try:
             # Scan DICOM files từ study paths
             all_files = []
             for file_path in study.file_paths:
-                if os.path.exists(file_path):
-                    if os.path.isdir(file_path):
-                        all_files.extend(self.dicom_handler.scan_directory(file_path))
-                    else:
-                        all_files.append(file_path)
+                # Một lần stat thay cho exists + isdir (+ stat lấy mtime)
+                try:
+                    st = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                
+                if stat.S_ISDIR(st.st_mode):
+                    path = os.path.normpath(os.path.abspath(file_path))
+                    all_files.extend(self._cached_scan(path, st.st_mtime_ns))
+                else:
+                    all_files.append(file_path)
             
             if not all_files:
                 logger.warning(f"No DICOM files found for study {study.study_uid}")
-                return
+                return series_list
             
             # Organize by series
             series_dict = self.dicom_handler.organize_by_series(all_files)
-            
-            # Add series to tree
-            for series_uid, series in series_dict.items():
-                series_item = QTreeWidgetItem([
-                    "Series",
-                    series.series_description,
-                    series.series_date.strftime('%Y-%m-%d') if series.series_date else "",
-                    series.modality,
-                    "1",
-                    str(series.slice_count)
-                ])
-                series_item.setData(0, Qt.UserRole, series)
-                study_item.addChild(series_item)
-                
-                # Store series reference
-                self.current_series[series_uid] = series
+            series_list = list(series_dict.values())
             
         except Exception as e:
             logger.error(f"Error loading series for study {study.study_uid}: {e}")
+        
+        return series_list
+    
+    def _scan_directory(self, path: str, mtime_ns: int) -> Tuple[str, ...]:
+        """Scan một thư mục DICOM (được memoize qua _cached_scan, mtime_ns chỉ dùng làm khóa)"""
+        return tuple(self.dicom_handler.scan_directory(path))
     
     def on_tree_selection_changed(self):
         """Handle tree selection change"""
-        current_item = self.tree_widget.currentItem()
+        item_data = self.tree_widget.currentIndex().data(Qt.UserRole)
         
-        if not current_item:
-            self.load_series_btn.setEnabled(False)
-            self.clear_series_details()
+        # Bỏ qua khi item đang hiển thị được chọn lại
+        selected_uid = (getattr(item_data, 'series_uid', None)
+                        or getattr(item_data, 'study_uid', None))
+        if selected_uid == self._last_selected_uid:
             return
-        
-        item_data = current_item.data(0, Qt.UserRole)
+        self._last_selected_uid = selected_uid
         
         if isinstance(item_data, DICOMSeries):
             # Series selected
@@ -434,9 +803,9 @@ class SeriesNavigatorWidget(QWidget):
             self.load_series_btn.setEnabled(False)
             self.clear_series_details()
     
-    def on_tree_item_double_clicked(self, item: QTreeWidgetItem, column: int):
+    def on_tree_item_double_clicked(self, index: QModelIndex):
         """Handle tree item double click"""
-        item_data = item.data(0, Qt.UserRole)
+        item_data = index.data(Qt.UserRole)
         
         if isinstance(item_data, DICOMSeries):
             # Auto-load series on double click
@@ -446,20 +815,19 @@ class SeriesNavigatorWidget(QWidget):
         """Hiển thị chi tiết series"""
         try:
             # Format series information
-            info_text = f"""
-Series Information:
-- UID: {series.series_uid}
-- Description: {series.series_description}
-- Modality: {series.modality}
-- Series Number: {series.series_number}
-- Slice Count: {series.slice_count}
-- Date: {series.series_date.strftime('%Y-%m-%d %H:%M:%S') if series.series_date else 'Unknown'}
-- Slice Thickness: {series.slice_thickness if series.slice_thickness else 'Unknown'} mm
-- Pixel Spacing: {series.pixel_spacing if series.pixel_spacing else 'Unknown'} mm
-- Files: {len(series.file_paths)}
-            """
+            fields = {
+                'series_uid': series.series_uid,
+                'series_description': series.series_description,
+                'modality': series.modality,
+                'series_number': series.series_number,
+                'slice_count': series.slice_count,
+                'date_str': series.series_date.strftime('%Y-%m-%d %H:%M:%S') if series.series_date else 'Unknown',
+                'slice_thickness': series.slice_thickness or 'Unknown',
+                'pixel_spacing': series.pixel_spacing or 'Unknown',
+                'file_count': len(series.file_paths),
+            }
             
-            self.series_info_text.setPlainText(info_text.strip())
+            self.series_info_text.setPlainText(self._SERIES_FMT.format_map(fields))
             
             # Load thumbnail nếu chưa có
             if series.series_uid not in self.series_thumbnails:
@@ -494,60 +862,73 @@ Study Information:
     
     def load_series_thumbnail(self, series: DICOMSeries):
         """Load thumbnail cho một series"""
-        try:
-            if not series.file_paths:
-                return
-            
-            # Load middle slice
-            mid_index = len(series.file_paths) // 2
-            mid_file = series.file_paths[mid_index]
-            
-            # TODO: Implement DICOM thumbnail loading
-            # For now, create placeholder
-            pixmap = QPixmap(128, 128)
-            pixmap.fill(Qt.darkGray)
+        self.load_thumbnails([series])
+    
+    def load_thumbnails(self, series_list: List[DICOMSeries]):
+        """Load thumbnails cho các series chưa có (song song trên thread pool)"""
+        pending = []
+        found = False
+        
+        for series in series_list:
+            if series.series_uid in self.series_thumbnails:
+                continue
             
-            self.series_thumbnails[series.series_uid] = pixmap
+            pixmap = self.find_cached_thumbnail(series.series_uid)
+            if pixmap is not None:
+                self.store_thumbnail(series.series_uid, pixmap)
+                found = True
+            else:
+                pending.append(series)
+        
+        if found:
             self.update_thumbnail_display()
-            
-        except Exception as e:
-            logger.error(f"Error loading thumbnail for series {series.series_uid}: {e}")
+        
+        if pending:
+            self.thumbnail_loader.load(pending)
+    
+    def find_cached_thumbnail(self, series_uid: str) -> Optional[QPixmap]:
+        """Tìm thumbnail trong QPixmapCache rồi trong cache PNG trên đĩa"""
+        pixmap = QPixmapCache.find(series_uid)
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap
+        
+        cache_path = thumbnail_cache_path(series_uid)
+        if cache_path.exists():
+            pixmap = QPixmap(str(cache_path))
+            if not pixmap.isNull():
+                QPixmapCache.insert(series_uid, pixmap)
+                return pixmap
+        
+        return None
+    
+    def on_thumbnail_ready(self, series_uid: str, pixmap: QPixmap):
+        """Nhận thumbnail từ ThumbnailLoader"""
+        QPixmapCache.insert(series_uid, pixmap)
+        self.store_thumbnail(series_uid, pixmap)
+        self.update_thumbnail_display()
+    
+    def store_thumbnail(self, series_uid: str, pixmap: QPixmap):
+        """Lưu thumbnail, scale một lần về kích thước hiển thị thay vì scale mỗi lần vẽ"""
+        if pixmap.width() > THUMBNAIL_SIZE or pixmap.height() > THUMBNAIL_SIZE:
+            pixmap = pixmap.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                                   Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.series_thumbnails[series_uid] = pixmap
     
     def update_thumbnail_display(self):
         """Update thumbnail display"""
-        # Clear existing thumbnails
-        self.clear_thumbnails()
-        
-        # Add current thumbnails
-        for series_uid, pixmap in self.series_thumbnails.items():
-            thumbnail_label = QLabel()
-            thumbnail_label.setPixmap(pixmap)
-            thumbnail_label.setScaledContents(True)
-            thumbnail_label.setFixedSize(128, 128)
-            thumbnail_label.setStyleSheet("border: 1px solid gray;")
-            self.thumbnail_layout.addWidget(thumbnail_label)
+        self.thumbnail_model.set_thumbnails(self.series_thumbnails)
     
     def clear_thumbnails(self):
         """Clear thumbnail display"""
-        while self.thumbnail_layout.count():
-            child = self.thumbnail_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
+        self.thumbnail_model.clear()
     
     def load_selected_series(self):
         """Load series được chọn"""
-        current_item = self.tree_widget.currentItem()
-        
-        if not current_item:
-            return
-        
-        item_data = current_item.data(0, Qt.UserRole)
+        series = self.get_selected_series()
         
-        if not isinstance(item_data, DICOMSeries):
+        if series is None:
             return
         
-        series = item_data
-        
         try:
             self.status_label.setText("Loading series...")
             self.progress_bar.setVisible(True)
@@ -635,18 +1016,19 @@ Study Information:
     
     def get_selected_series(self) -> Optional[DICOMSeries]:
         """Lấy series được chọn"""
-        current_item = self.tree_widget.currentItem()
+        item_data = self.tree_widget.currentIndex().data(Qt.UserRole)
         
-        if current_item:
-            item_data = current_item.data(0, Qt.UserRole)
-            if isinstance(item_data, DICOMSeries):
-                return item_data
+        if isinstance(item_data, DICOMSeries):
+            return item_data
         
         return None
     
     def refresh_current_patient(self):
         """Refresh data cho patient hiện tại"""
         if self.current_patient:
+            # Bỏ HTML đã cache, thông tin có thể đã thay đổi
+            self.current_patient.__dict__.pop('_info_html', None)
+            
             # Reload patient from database
             updated_patient = self.patient_manager.get_patient(self.current_patient.patient_id)
             if updated_patient:
@@ -1,20 +1,67 @@
 #!/usr/bin/env python3
 """
 Test visualization components cho TPS
+
+Các viewer test dùng chung một volume read-only từ _get_test_volume();
+widget nào cần sửa dữ liệu phải tự copy.
 """
 
 import sys
 import os
 from pathlib import Path
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 
+try:
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    _HAS_QT = True
+except ImportError:
+    _HAS_QT = False
+
 # Add src to Python path  
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bộ sinh số ngẫu nhiên PCG64 với seed cố định để dữ liệu test tái lập được
+_RNG = np.random.default_rng(0)
+
+# Volume test dùng chung cho các viewer test, chỉ tạo một lần
+_TEST_VOLUME = None
+
+def _get_test_volume():
+    """Lấy volume test (50x256x256 uint8, read-only)"""
+    global _TEST_VOLUME
+    if _TEST_VOLUME is None:
+        # uint8 đủ cho smoke test viewer, nhỏ bằng nửa int16
+        volume = _RNG.integers(0, 256, (50, 256, 256), dtype=np.uint8, endpoint=False)
+        volume.setflags(write=False)
+        _TEST_VOLUME = volume
+    return _TEST_VOLUME
+
+# Registry các test theo thứ tự khai báo: (tên, hàm, chạy được ngoài main thread)
+_TESTS = []
+
+def register(name, thread_safe=False):
+    """Decorator đăng ký một test vào _TESTS"""
+    def deco(fn):
+        _TESTS.append((name, fn, thread_safe))
+        return fn
+    return deco
+
+# QApplication dùng chung cho mọi Qt test
+_QAPP = None
+
+def _ensure_qapp():
+    """Tạo QApplication nếu chưa có và trả về instance dùng chung"""
+    global _QAPP
+    _QAPP = _QAPP or QApplication.instance() or QApplication(sys.argv)
+    return _QAPP
+
+@register("VTK Import", thread_safe=True)
 def test_vtk_import():
     """Test VTK import"""
     logger.info("Testing VTK import...")
@@ -28,8 +75,9 @@ def test_vtk_import():
         logger.info("Install VTK: pip install vtk")
         return False
 
+@register("GUI Components Import", thread_safe=True)
 def test_gui_components():
-    """Test GUI components"""
+    """Test import GUI components (import thật để bắt cả dependency của module)"""
     logger.info("Testing GUI components...")
     
     try:
@@ -54,25 +102,24 @@ def test_gui_components():
         logger.error(f"✗ GUI component import failed: {e}")
         return False
 
+@register("ImageViewerWidget")
 def test_image_viewer_widget():
     """Test ImageViewerWidget creation"""
     logger.info("Testing ImageViewerWidget creation...")
     
+    if not _HAS_QT:
+        logger.error("✗ PyQt5 not available - skipped")
+        return False
+    
     try:
-        from PyQt5.QtWidgets import QApplication
         from src.gui.image_viewer_widget import ImageViewerWidget
         
-        app = QApplication.instance()
-        if app is None:
-            app = QApplication(sys.argv)
-        
         # Test tạo widget
         viewer = ImageViewerWidget("axial")
         logger.info("✓ ImageViewerWidget creation: OK")
         
         # Test load test data
-        test_data = np.random.randint(0, 1000, (50, 256, 256), dtype=np.int16)
-        viewer.load_image_data(test_data, spacing=(1.0, 1.0, 1.0))
+        viewer.load_image_data(_get_test_volume(), spacing=(1.0, 1.0, 1.0))
         logger.info("✓ Test data loading: OK")
         
         return True
@@ -81,25 +128,24 @@ def test_image_viewer_widget():
         logger.error(f"✗ ImageViewerWidget test failed: {e}")
         return False
 
+@register("MPRViewerWidget")
 def test_mpr_viewer_widget():
     """Test MPRViewerWidget creation"""
     logger.info("Testing MPRViewerWidget creation...")
     
+    if not _HAS_QT:
+        logger.error("✗ PyQt5 not available - skipped")
+        return False
+    
     try:
-        from PyQt5.QtWidgets import QApplication
         from src.gui.mpr_viewer_widget import MPRViewerWidget
         
-        app = QApplication.instance()
-        if app is None:
-            app = QApplication(sys.argv)
-        
         # Test tạo widget
         mpr_viewer = MPRViewerWidget()
         logger.info("✓ MPRViewerWidget creation: OK")
         
         # Test load test data
-        test_data = np.random.randint(0, 1000, (50, 256, 256), dtype=np.int16)
-        mpr_viewer.load_image_data(test_data, spacing=(1.0, 1.0, 1.0))
+        mpr_viewer.load_image_data(_get_test_volume(), spacing=(1.0, 1.0, 1.0))
         logger.info("✓ MPR test data loading: OK")
         
         return True
@@ -108,21 +154,21 @@ def test_mpr_viewer_widget():
         logger.error(f"✗ MPRViewerWidget test failed: {e}")
         return False
 
+@register("ImageWorkspace")
 def test_image_workspace():
     """Test ImageWorkspace creation"""
     logger.info("Testing ImageWorkspace creation...")
     
+    if not _HAS_QT:
+        logger.error("✗ PyQt5 not available - skipped")
+        return False
+    
     try:
-        from PyQt5.QtWidgets import QApplication
         from src.gui.image_workspace import ImageWorkspace
         from src.core.patient_manager import PatientManager
         
-        app = QApplication.instance()
-        if app is None:
-            app = QApplication(sys.argv)
-        
         # Test tạo workspace
-        pm = PatientManager(db_path="test_viz.db")
+        pm = PatientManager(db_path=":memory:")
         workspace = ImageWorkspace(pm)
         logger.info("✓ ImageWorkspace creation: OK")
         
@@ -132,32 +178,33 @@ def test_image_workspace():
         logger.error(f"✗ ImageWorkspace test failed: {e}")
         return False
 
+@register("Full GUI Display")
 def test_full_gui():
     """Test full GUI với hiển thị"""
     logger.info("Testing full GUI display...")
     
+    if not _HAS_QT:
+        logger.error("✗ PyQt5 not available - skipped")
+        return False
+    
     try:
-        from PyQt5.QtWidgets import QApplication
         from src.gui.image_workspace import ImageWorkspace
         from src.core.patient_manager import PatientManager
         
-        app = QApplication.instance()
-        if app is None:
-            app = QApplication(sys.argv)
+        app = _ensure_qapp()
         
         # Tạo workspace
-        pm = PatientManager(db_path="test_viz.db")
+        pm = PatientManager(db_path=":memory:")
         workspace = ImageWorkspace(pm)
         
-        # Show workspace (không exec để test không block)
+        # Show workspace (event loop tự thoát sau lượt idle đầu tiên nên test không block)
         workspace.show()
         logger.info("✓ GUI display: OK")
         
-        # Process events một chút
-        app.processEvents()
-        
-        # Close
-        workspace.close()
+        # Chạy event loop đến lượt idle đầu tiên (sau show/paint) rồi close và thoát
+        QTimer.singleShot(0, workspace.close)
+        QTimer.singleShot(0, app.quit)
+        app.exec_()
         
         return True
         
@@ -165,48 +212,64 @@ def test_full_gui():
         logger.error(f"✗ Full GUI test failed: {e}")
         return False
 
-def cleanup():
-    """Cleanup test files"""
-    test_files = ["test_viz.db"]
-    for file in test_files:
-        if os.path.exists(file):
-            try:
-                os.remove(file)
-                logger.info(f"Cleaned up: {file}")
-            except:
-                pass
+def run_test(test_name, test_func):
+    """Chạy một test và log kết quả"""
+    logger.info(f"\n--- Testing {test_name} ---")
+    try:
+        if test_func():
+            logger.info(f"{test_name}: PASSED ✓")
+            return True
+        logger.error(f"{test_name}: FAILED ✗")
+    except Exception as e:
+        logger.error(f"{test_name}: ERROR - {e}")
+    return False
 
 def main():
     """Main test function"""
+    # Không có display (CI/headless): dùng platform offscreen thay vì chờ X server
+    if not os.environ.get("DISPLAY") and sys.platform not in ("win32", "darwin"):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    
     logger.info("=== TPS VISUALIZATION TESTS ===")
     
-    tests = [
-        ("VTK Import", test_vtk_import),
-        ("GUI Components Import", test_gui_components),
-        ("ImageViewerWidget", test_image_viewer_widget),
-        ("MPRViewerWidget", test_mpr_viewer_widget),
-        ("ImageWorkspace", test_image_workspace),
-        ("Full GUI Display", test_full_gui)
-    ]
+    # Test chỉ import module chạy song song trên worker threads,
+    # test tạo widget phải chạy trên main thread (yêu cầu của Qt)
+    thread_safe_tests = [(name, func) for name, func, thread_safe in _TESTS if thread_safe]
+    qt_tests = [(name, func) for name, func, thread_safe in _TESTS if not thread_safe]
     
     passed = 0
     failed = 0
     
-    for test_name, test_func in tests:
-        logger.info(f"\n--- Testing {test_name} ---")
-        try:
-            if test_func():
+    import_results = {}
+    
+    with ThreadPoolExecutor(max_workers=len(thread_safe_tests)) as executor:
+        futures = {executor.submit(run_test, name, func): name for name, func in thread_safe_tests}
+        for future in as_completed(futures):
+            import_results[futures[future]] = future.result()
+            if import_results[futures[future]]:
                 passed += 1
-                logger.info(f"{test_name}: PASSED ✓")
             else:
                 failed += 1
-                logger.error(f"{test_name}: FAILED ✗")
+    
+    # Thiếu VTK hoặc module GUI thì các test widget chắc chắn lỗi, bỏ qua luôn
+    vtk_ok = import_results.get("VTK Import", False)
+    gui_ok = import_results.get("GUI Components Import", False)
+    
+    if _HAS_QT and vtk_ok and gui_ok:
+        try:
+            _ensure_qapp()
         except Exception as e:
-            failed += 1
-            logger.error(f"{test_name}: ERROR - {e}")
+            logger.error(f"Cannot create QApplication: {e}")
     
-    # Cleanup
-    cleanup()
+    for test_name, test_func in qt_tests:
+        if not (vtk_ok and gui_ok):
+            logger.warning(f"{test_name}: SKIPPED (missing deps)")
+            failed += 1
+            continue
+        if run_test(test_name, test_func):
+            passed += 1
+        else:
+            failed += 1
     
     logger.info(f"\n=== VISUALIZATION TEST RESULTS ===")
     logger.info(f"Passed: {passed}")